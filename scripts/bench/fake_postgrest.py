@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""In-memory stand-in for the PostgREST endpoints the DUO scripts use.
+
+Usage:
+  python3 scripts/bench/fake_postgrest.py [--port 54321] [--schools 1000]
+      [--latency-ms 0] [--throttle-rate 0] [--max-rows 1000]
+
+Serves /rest/v1/schools, school_metrics, school_facts and data_sync_runs
+(select with aliases, eq/neq/in/lt/gt/is filters, order, limit/offset and
+Range pagination with Prefer: count=exact, a max-rows cap, JSON or text/csv
+gzip responses, inserts, on_conflict upserts, PATCH, DELETE) and
+/rest/v1/rpc/duo_bulk_update_schools. Every request can be delayed by a
+fixed latency, and a fraction can be answered with 429 + Retry-After.
+
+Writes follow PostgREST: the inserted columns are `?columns=` or the keys of
+the first row, a key missing from a row stores NULL, and a merge-duplicates
+upsert overwrites exactly those columns. Responses render integral floats
+the way Postgres prints float8 (12, not 12.0), so reruns see what a real
+backend returns.
+
+Bench endpoints: GET /__bench/stats returns request/byte/row counters per
+endpoint; POST /__bench/reset clears them (and restores the initial tables
+with ?data=1).
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from synthetic import existing_schools
+
+Row = Dict[str, Any]
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def parse_value(raw: str) -> Any:
+    if raw == "null":
+        return None
+    if raw in ("true", "false"):
+        return raw == "true"
+    return raw
+
+
+def split_list(raw: str) -> List[str]:
+    inner = raw[1:-1] if raw.startswith("(") and raw.endswith(")") else raw
+    return [v.strip().strip('"') for v in inner.split(",")] if inner else []
+
+
+def pg_value(value: Any) -> Any:
+    """A column value as PostgREST renders it: float8 12.0 comes back as 12."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def pg_rows(rows: List[Row]) -> List[Row]:
+    # Top-level columns only; jsonb values keep their own number formatting.
+    return [{k: pg_value(v) for k, v in row.items()} for row in rows]
+
+
+def compare_key(value: Any) -> Tuple[int, Any]:
+    if value is None:
+        return (1, "")
+    if isinstance(value, (int, float)):
+        return (0, value)
+    try:
+        return (0, float(value))
+    except (TypeError, ValueError):
+        return (0, str(value))
+
+
+class Filter:
+    """One `column=op.value` query filter; eq/in on an indexed column can use the index."""
+
+    def __init__(self, column: str, expr: str) -> None:
+        self.column = column
+        op, _, raw = expr.partition(".")
+        self.negate = op == "not"
+        if self.negate:
+            op, _, raw = raw.partition(".")
+        if op not in ("eq", "neq", "in", "is", "lt", "lte", "gt", "gte"):
+            raise ValueError(f"unsupported filter operator: {op}")
+        self.op = op
+        self.values = set(split_list(raw)) if op == "in" else None
+        self.value = parse_value(raw)
+        self.bound = compare_key(self.value)
+
+    def keys(self) -> Optional[List[str]]:
+        """Exact values this filter selects, if it can be answered from an index."""
+        if self.negate:
+            return None
+        if self.op == "in":
+            return list(self.values or ())
+        if self.op == "eq" and self.value is not None:
+            return [str(self.value)]
+        return None
+
+    def __call__(self, row: Row) -> bool:
+        value = row.get(self.column)
+        op = self.op
+        if op == "in":
+            result = str(value) in (self.values or ())
+        elif op == "is":
+            result = value is self.value or value == self.value
+        elif op in ("eq", "neq"):
+            equal = value == self.value or (value is not None and str(value) == str(self.value))
+            result = equal if op == "eq" else not equal
+        elif value is None:
+            result = False
+        else:
+            key = compare_key(value)
+            bound = self.bound
+            result = {"lt": key < bound, "lte": key <= bound, "gt": key > bound, "gte": key >= bound}[op]
+        return not result if self.negate else result
+
+
+class Table:
+    def __init__(self, rows: List[Row], indexed: Tuple[str, ...] = (), key: str = "id") -> None:
+        self.key = key
+        self.rows: Dict[str, Row] = {}
+        self.indexes: Dict[str, Dict[str, Dict[str, Row]]] = {column: defaultdict(dict) for column in indexed}
+        for row in rows:
+            self.put(dict(row))
+
+    def put(self, row: Row) -> None:
+        self.rows[row[self.key]] = row
+        for column, index in self.indexes.items():
+            index[str(row.get(column))][row[self.key]] = row
+
+    def remove(self, row: Row) -> None:
+        del self.rows[row[self.key]]
+        for column, index in self.indexes.items():
+            index[str(row.get(column))].pop(row[self.key], None)
+
+    def update(self, row: Row, changes: Row) -> None:
+        self.remove(row)
+        row.update(changes)
+        self.put(row)
+
+    def query(self, filters: List[Filter], order: Optional[str]) -> List[Row]:
+        candidates: Any = self.rows.values()
+        for f in filters:
+            keys = f.keys()
+            if f.column == self.key and keys is not None:
+                candidates = [self.rows[k] for k in keys if k in self.rows]
+                break
+            if f.column in self.indexes and keys is not None:
+                index = self.indexes[f.column]
+                candidates = [row for k in keys for row in index.get(k, {}).values()]
+                break
+        rows = [row for row in candidates if all(f(row) for f in filters)]
+        if order:
+            for term in reversed(order.split(",")):
+                column, _, direction = term.partition(".")
+                rows.sort(key=lambda r: compare_key(r.get(column)), reverse=direction.startswith("desc"))
+        return rows
+
+
+class Store:
+    def __init__(self, schools: int) -> None:
+        self.schools = schools
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.tables = {
+                "schools": Table(existing_schools(self.schools)),
+                "school_metrics": Table([], indexed=("school_id",)),
+                "data_sync_runs": Table([]),
+                "school_facts": Table([], key="school_id"),
+            }
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.endpoints: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+            self.started = time.monotonic()
+
+    def add(self, endpoint: str, **counters: float) -> None:
+        with self.lock:
+            entry = self.endpoints[endpoint]
+            for name, value in counters.items():
+                entry[name] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            endpoints = {name: dict(counters) for name, counters in self.endpoints.items()}
+        totals: Dict[str, float] = defaultdict(float)
+        for counters in endpoints.values():
+            for name, value in counters.items():
+                totals[name] += value
+        return {"elapsed_s": time.monotonic() - self.started, "totals": dict(totals), "endpoints": endpoints}
+
+
+def csv_body(rows: List[Row]) -> bytes:
+    """PostgREST-style CSV: header line, then one line per row, no trailing newline."""
+    if not rows:
+        return b""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(rows[0].keys())
+    writer.writerows(["" if v is None else pg_value(v) for v in row.values()] for row in rows)
+    return out.getvalue().rstrip("\n").encode("utf-8")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakePostgrest"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.dispatch("GET")
+
+    def do_POST(self) -> None:
+        self.dispatch("POST")
+
+    def do_PATCH(self) -> None:
+        self.dispatch("PATCH")
+
+    def do_DELETE(self) -> None:
+        self.dispatch("DELETE")
+
+    def dispatch(self, method: str) -> None:
+        parsed = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        if parsed.path.startswith("/__bench/"):
+            return self.bench(method, parsed)
+
+        endpoint = f"{method} {parsed.path.replace('/rest/v1/', '')}"
+        self.server.stats.add(endpoint, requests=1, bytes_in=length)
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        if self.server.throttle_rate and random.random() < self.server.throttle_rate:
+            self.server.stats.add(endpoint, throttled=1)
+            return self.reply(429, {"message": "rate limited"}, {"Retry-After": "0"}, endpoint=endpoint)
+
+        path = parsed.path
+        if not path.startswith("/rest/v1/"):
+            return self.reply(404, {"message": "not found"}, endpoint=endpoint)
+        name = path[len("/rest/v1/") :]
+        params = urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+        try:
+            if name == "rpc/duo_bulk_update_schools" and method == "POST":
+                return self.bulk_update(json.loads(body or b"{}"), endpoint)
+            if name not in self.server.store.tables:
+                return self.reply(404, {"code": "PGRST205", "message": f"unknown table {name}"}, endpoint=endpoint)
+            table = self.server.store.tables[name]
+            if method == "GET":
+                return self.select(table, params, endpoint)
+            if method == "POST":
+                return self.insert(table, params, json.loads(body or b"[]"), endpoint)
+            if method == "PATCH":
+                return self.update(table, params, json.loads(body or b"{}"), endpoint)
+            return self.delete(table, params, endpoint)
+        except ValueError as e:
+            return self.reply(400, {"message": str(e)}, endpoint=endpoint)
+
+    def filters(self, params: List[Tuple[str, str]]) -> List[Filter]:
+        return [Filter(k, v) for k, v in params if k not in RESERVED_PARAMS]
+
+    def select(self, table: Table, params: List[Tuple[str, str]], endpoint: str) -> None:
+        query = dict(params)
+        with self.server.store.lock:
+            rows = table.query(self.filters(params), query.get("order"))
+        total = len(rows)
+        offset = int(query.get("offset") or 0)
+        limit = int(query["limit"]) if "limit" in query else None
+        range_header = self.headers.get("Range")
+        if range_header:
+            start, _, end = range_header.partition("-")
+            offset = int(start)
+            limit = int(end) - offset + 1 if end else None
+        limit = min(limit, self.server.max_rows) if limit is not None else self.server.max_rows
+        page = rows[offset : offset + limit]
+        columns = [c for c in (query.get("select") or "*").split(",") if c]
+        if columns != ["*"]:
+            aliased = [c.split(":", 1) if ":" in c else (c, c) for c in columns]
+            page = [{out: row.get(src) for out, src in aliased} for row in page]
+        exact = "count=exact" in (self.headers.get("Prefer") or "")
+        count = str(total) if exact else "*"
+        content_range = f"{offset}-{offset + len(page) - 1}/{count}" if page else f"*/{count}"
+        status = 206 if range_header and exact and len(page) < total else 200
+        self.server.stats.add(endpoint, rows_out=len(page))
+        if "text/csv" in (self.headers.get("Accept") or ""):
+            return self.reply(status, csv_body(page), {"Content-Range": content_range}, endpoint=endpoint)
+        self.reply(status, pg_rows(page), {"Content-Range": content_range}, endpoint=endpoint)
+
+    def insert(self, table: Table, params: List[Tuple[str, str]], payload: Any, endpoint: str) -> None:
+        rows = payload if isinstance(payload, list) else [payload]
+        query = dict(params)
+        upsert = query.get("on_conflict") == table.key and "merge-duplicates" in (self.headers.get("Prefer") or "")
+        # Like PostgREST: ?columns= or the first row's keys; keys a row leaves out are NULL.
+        if query.get("columns"):
+            columns = [c for c in query["columns"].split(",") if c]
+        else:
+            columns = list(rows[0]) if rows else []
+        rows = [{c: row.get(c) for c in columns} for row in rows]
+        with self.server.store.lock:
+            for row in rows:
+                row_id = row.get(table.key)
+                if row_id and row_id in table.rows:
+                    if not upsert:
+                        return self.reply(409, {"code": "23505", "message": "duplicate key"}, endpoint=endpoint)
+                    # ON CONFLICT DO UPDATE SET <each inserted column> = EXCLUDED.<column>
+                    table.update(table.rows[row_id], row)
+                elif row_id or table.key == "id":
+                    row = dict(row)
+                    row[table.key] = row_id or str(uuid.uuid4())
+                    table.put(row)
+                else:
+                    return self.reply(400, {"message": f"null value in column {table.key}"}, endpoint=endpoint)
+        self.server.stats.add(endpoint, rows_in=len(rows))
+        self.reply(201, None, endpoint=endpoint)
+
+    def update(self, table: Table, params: List[Tuple[str, str]], payload: Row, endpoint: str) -> None:
+        with self.server.store.lock:
+            rows = table.query(self.filters(params), None)
+            for row in rows:
+                table.update(row, payload)
+        self.server.stats.add(endpoint, rows_in=len(rows))
+        self.reply(204, None, endpoint=endpoint)
+
+    def delete(self, table: Table, params: List[Tuple[str, str]], endpoint: str) -> None:
+        filters = self.filters(params)
+        if not filters:
+            return self.reply(400, {"message": "DELETE requires a filter"}, endpoint=endpoint)
+        with self.server.store.lock:
+            rows = table.query(filters, None)
+            for row in rows:
+                table.remove(row)
+        self.server.stats.add(endpoint, rows_deleted=len(rows))
+        self.reply(204, None, endpoint=endpoint)
+
+    def bulk_update(self, payload: Dict[str, Any], endpoint: str) -> None:
+        updates = payload.get("p_updates") or []
+        schools = self.server.store.tables["schools"]
+        updated = 0
+        with self.server.store.lock:
+            for update in updates:
+                row = schools.rows.get(update.get("id"))
+                if row is not None:
+                    schools.update(row, {k: v for k, v in update.items() if k != "id"})
+                    updated += 1
+        self.server.stats.add(endpoint, rows_in=updated)
+        self.reply(200, updated, endpoint=endpoint)
+
+    def bench(self, method: str, parsed: urllib.parse.SplitResult) -> None:
+        if method == "GET" and parsed.path == "/__bench/stats":
+            return self.reply(200, self.server.stats.snapshot())
+        if method == "POST" and parsed.path == "/__bench/reset":
+            if dict(urllib.parse.parse_qsl(parsed.query)).get("data") == "1":
+                self.server.store.reset()
+            self.server.stats.reset()
+            return self.reply(204, None)
+        self.reply(404, {"message": "not found"})
+
+    def reply(
+        self,
+        status: int,
+        payload: Any,
+        headers: Optional[Dict[str, str]] = None,
+        endpoint: Optional[str] = None,
+    ) -> None:
+        if isinstance(payload, bytes):
+            body, content_type = payload, "text/csv; charset=utf-8"
+        else:
+            body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body:
+            self.send_header("Content-Type", content_type)
+            if "gzip" in (self.headers.get("Accept-Encoding") or "") and len(body) > 512:
+                body = gzip.compress(body, compresslevel=1)
+                self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if endpoint:
+            self.server.stats.add(endpoint, bytes_out=len(body))
+
+
+class FakePostgrest(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        schools: int,
+        latency_ms: float = 0.0,
+        throttle_rate: float = 0.0,
+        max_rows: int = 1000,
+    ) -> None:
+        super().__init__(address, Handler)
+        self.store = Store(schools)
+        self.stats = Stats()
+        self.latency = latency_ms / 1000.0
+        self.throttle_rate = throttle_rate
+        self.max_rows = max_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--schools", type=int, default=1000, help="vestigingen to derive the schools table from")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--max-rows", type=int, default=1000, help="server-side page cap (db-max-rows)")
+    args = parser.parse_args()
+    server = FakePostgrest((args.host, args.port), args.schools, args.latency_ms, args.throttle_rate, args.max_rows)
+    schools = len(server.store.tables["schools"].rows)
+    print(f"Fake PostgREST on http://{args.host}:{server.server_address[1]} ({schools} schools)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
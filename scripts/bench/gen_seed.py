@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Generate a synthetic DUO seed workbook (Schools_AMS_main + Metrics_long).
+
+Usage:
+  python3 scripts/bench/gen_seed.py out.xlsx --schools 1000 --metrics 100000 [--period 2024] [--seed 1]
+  python3 scripts/bench/gen_seed.py out_dir --format csv|tsv|ndjson [...]
+
+Sheets are streamed into the archive row by row and text cells go through a
+shared-string table, like Excel output, so 1M metric rows stay cheap to write.
+Text formats write a seed directory with one `<sheet>.<ext>` file per sheet
+holding the same rows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import random
+import zipfile
+from typing import IO, Dict, Iterable, List, Optional, Union
+from xml.sax.saxutils import escape
+
+from synthetic import METRIC_GROUPS, METRICS_HEADERS, SCHOOLS_HEADERS, metric_value, vestiging
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+SHEETS = ["Schools_AMS_main", "Metrics_long"]
+
+Cell = Union[str, int, float, None]
+
+
+def col_letters(n: int) -> str:
+    letters = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        letters = chr(65 + r) + letters
+    return letters
+
+
+class SharedStringTable:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def index(self, value: str) -> int:
+        i = self._index.get(value)
+        if i is None:
+            i = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+
+def write_sheet(f: IO[bytes], rows: Iterable[List[Cell]], sst: SharedStringTable) -> int:
+    f.write(f'<?xml version="1.0" encoding="UTF-8"?><worksheet xmlns="{MAIN_NS}"><sheetData>'.encode("utf-8"))
+    count = 0
+    parts: List[str] = []
+    for r, row in enumerate(rows, 1):
+        parts.append(f'<row r="{r}">')
+        for c, value in enumerate(row, 1):
+            if value is None or value == "":
+                continue
+            ref = f"{col_letters(c)}{r}"
+            if isinstance(value, (int, float)):
+                parts.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                parts.append(f'<c r="{ref}" t="s"><v>{sst.index(value)}</v></c>')
+        parts.append("</row>")
+        count += 1
+        if len(parts) > 4096:
+            f.write("".join(parts).encode("utf-8"))
+            parts = []
+    parts.append("</sheetData></worksheet>")
+    f.write("".join(parts).encode("utf-8"))
+    return count - 1
+
+
+def school_rows(schools: int) -> Iterable[List[Cell]]:
+    yield list(SCHOOLS_HEADERS)
+    for i in range(schools):
+        v = vestiging(i)
+        yield [v[h] for h in SCHOOLS_HEADERS]
+
+
+def metric_rows(schools: int, metrics: int, period: str, seed: int) -> Iterable[List[Cell]]:
+    yield list(METRICS_HEADERS)
+    rng = random.Random(seed)
+    ids = [vestiging(i)["school_id"] for i in range(schools)]
+    for j in range(metrics):
+        n = j // schools
+        value: Cell = metric_value(rng)
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        yield [
+            ids[j % schools],
+            period,
+            METRIC_GROUPS[n % len(METRIC_GROUPS)],
+            f"metric_{n}",
+            value,
+            "aantal",
+            None,
+            "YES" if rng.random() > 0.02 else "NO",
+            "DUO open data",
+        ]
+
+
+def generate(path: str, schools: int, metrics: int, period: str = "2024", seed: int = 1) -> None:
+    sst = SharedStringTable()
+    sheet_xml = "".join(f'<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>' for n, name in enumerate(SHEETS, 1))
+    rels = "".join(
+        f'<Relationship Id="rId{n}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, len(SHEETS) + 1)
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(
+            "xl/workbook.xml",
+            f'<?xml version="1.0" encoding="UTF-8"?><workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+            f"<sheets>{sheet_xml}</sheets></workbook>",
+        )
+        z.writestr(
+            "xl/_rels/workbook.xml.rels",
+            f'<?xml version="1.0" encoding="UTF-8"?><Relationships xmlns="{PKG_REL_NS}">{rels}</Relationships>',
+        )
+        with z.open("xl/worksheets/sheet1.xml", "w") as f:
+            write_sheet(f, school_rows(schools), sst)
+        with z.open("xl/worksheets/sheet2.xml", "w", force_zip64=True) as f:
+            write_sheet(f, metric_rows(schools, metrics, period, seed), sst)
+        with z.open("xl/sharedStrings.xml", "w") as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8"?><sst xmlns="{MAIN_NS}">'.encode("utf-8"))
+            for start in range(0, len(sst.strings), 4096):
+                chunk = sst.strings[start : start + 4096]
+                f.write("".join(f"<si><t>{escape(s)}</t></si>" for s in chunk).encode("utf-8"))
+            f.write(b"</sst>")
+
+
+def generate_dir(
+    path: str, schools: int, metrics: int, fmt: str = "csv", period: str = "2024", seed: int = 1
+) -> None:
+    os.makedirs(path, exist_ok=True)
+    sheets = {"Schools_AMS_main": school_rows(schools), "Metrics_long": metric_rows(schools, metrics, period, seed)}
+    for name, rows in sheets.items():
+        with open(os.path.join(path, f"{name}.{fmt}"), "w", encoding="utf-8", newline="") as f:
+            if fmt == "ndjson":
+                headers = next(iter(rows))
+                for row in rows:
+                    f.write(json.dumps(dict(zip(headers, row)), ensure_ascii=False) + "\n")
+            else:
+                csv.writer(f, delimiter="\t" if fmt == "tsv" else ",", lineterminator="\n").writerows(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--schools", type=int, default=1000)
+    parser.add_argument("--metrics", type=int, default=100_000)
+    parser.add_argument("--period", default="2024")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--format", choices=["xlsx", "csv", "tsv", "ndjson"], default="xlsx")
+    args = parser.parse_args(argv)
+    if args.format == "xlsx":
+        generate(args.output, args.schools, args.metrics, args.period, args.seed)
+    else:
+        generate_dir(args.output, args.schools, args.metrics, args.format, args.period, args.seed)
+    print(f"Wrote {args.output} ({args.schools} schools, {args.metrics} metric rows)")
+
+
+if __name__ == "__main__":
+    main()
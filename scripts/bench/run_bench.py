@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Benchmark the DUO import/export scripts against the fake PostgREST server.
+
+Usage:
+  python3 scripts/bench/run_bench.py [--scale 100x1000 --scale 1000x100000]
+      [--modes import-diff,import-diff-rerun,import-full,import-pipeline,plan,apply,export,export-stream]
+      [--latency-ms 0] [--throttle-rate 0] [--seed-format xlsx|csv|tsv|ndjson]
+      [--workdir scripts/bench/.work] [--json out.json]
+
+Each scale is SCHOOLSxMETRICS. Seeds are generated once per scale into the
+workdir (an .xlsx, or a sheet directory for the text formats). Per scale the
+runner times parsing, the schools snapshot and matching in-process, then runs
+every mode as a subprocess against a fresh fake server and reports wall time,
+requests, bytes sent/received, rows written and rows/s.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+from gen_seed import generate, generate_dir  # noqa: E402
+from import_duo_school_data import load_snapshot, read_seed  # noqa: E402
+from school_matcher import SchoolMatcher  # noqa: E402
+from supabase_rest import RestClient  # noqa: E402
+
+IMPORTER = os.path.join(SCRIPTS_DIR, "import_duo_school_data.py")
+EXPORTER = os.path.join(SCRIPTS_DIR, "export_school_ids.py")
+
+# mode -> (reset server data first, extra env)
+MODES: Dict[str, Tuple[bool, Dict[str, str]]] = {
+    "import-diff": (True, {"DUO_METRICS_SYNC": "diff"}),
+    "import-diff-rerun": (False, {"DUO_METRICS_SYNC": "diff"}),
+    "import-full": (True, {"DUO_METRICS_SYNC": "full"}),
+    "import-pipeline": (True, {"DUO_PIPELINE": "1"}),
+    "plan": (True, {}),
+    "apply": (False, {}),
+    "export": (False, {}),
+    "export-stream": (False, {"EXPORT_STREAM": "1"}),
+}
+# Modes that only read from the server: their rows/s is over rows read, not written.
+READ_ONLY_MODES = {"plan", "export", "export-stream"}
+
+
+def parse_scale(value: str) -> Tuple[int, int]:
+    schools, _, metrics = value.lower().partition("x")
+    return int(schools), int(metrics)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class BenchServer:
+    def __init__(self, schools: int, latency_ms: float, throttle_rate: float) -> None:
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(BENCH_DIR, "fake_postgrest.py"),
+                "--port",
+                str(self.port),
+                "--schools",
+                str(schools),
+                "--latency-ms",
+                str(latency_ms),
+                "--throttle-rate",
+                str(throttle_rate),
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return
+            except OSError:
+                if time.monotonic() > deadline or self.proc.poll() is not None:
+                    raise RuntimeError("fake PostgREST did not start")
+                time.sleep(0.05)
+
+    def reset(self, data: bool) -> None:
+        req = urllib.request.Request(f"{self.url}/__bench/reset?data={1 if data else 0}", method="POST")
+        urllib.request.urlopen(req).close()
+
+    def stats(self) -> Dict[str, Any]:
+        with urllib.request.urlopen(f"{self.url}/__bench/stats") as resp:
+            return json.loads(resp.read())
+
+    def close(self) -> None:
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def timed(fn: Any, *args: Any) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def in_process_phases(server: BenchServer, seed: str) -> Dict[str, Any]:
+    (duo_rows, metrics), parse_s = timed(read_seed, [seed], 0, None)
+    client = RestClient(f"{server.url}/rest/v1", {"apikey": "bench", "Content-Type": "application/json"})
+    matcher = SchoolMatcher(fuzzy_threshold=0.75)
+    _, snapshot_s = timed(load_snapshot, client, matcher, 4)
+    results, match_s = timed(lambda: [matcher.match(d) for d in duo_rows])
+    client.close()
+    return {
+        "parse_s": parse_s,
+        "metric_rows": len(metrics),
+        "parse_rows_per_s": len(metrics) / parse_s if parse_s else 0.0,
+        "snapshot_s": snapshot_s,
+        "schools": len(matcher.schools),
+        "match_s": match_s,
+        "matched": sum(1 for r in results if r.target),
+        "duo_rows": len(duo_rows),
+    }
+
+
+def run_mode(server: BenchServer, mode: str, seed: str, workdir: str, env: Dict[str, str]) -> Dict[str, Any]:
+    reset_data, extra_env = MODES[mode]
+    server.reset(reset_data)
+    plan_path = os.path.join(workdir, "plan.jsonl.gz")
+    if mode.startswith("export"):
+        cmd = [sys.executable, EXPORTER]
+    elif mode == "plan":
+        cmd = [sys.executable, IMPORTER, "plan", seed, "--out", plan_path]
+    elif mode == "apply":
+        cmd = [sys.executable, IMPORTER, "apply", plan_path]
+    else:
+        cmd = [sys.executable, IMPORTER, seed]
+    stats_path = os.path.join(workdir, "run_stats.json")
+    if os.path.exists(stats_path):
+        os.remove(stats_path)
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, env={**env, **extra_env}, cwd=workdir, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} failed ({proc.returncode}):\n{proc.stdout}\n{proc.stderr}")
+    totals = server.stats()["totals"]
+    rows_written = totals.get("rows_in", 0) + totals.get("rows_deleted", 0)
+    rows_read = totals.get("rows_out", 0)
+    rows = rows_read if mode in READ_ONLY_MODES else rows_written
+    phases = {}
+    if os.path.exists(stats_path):
+        with open(stats_path, encoding="utf-8") as f:
+            phases = json.load(f).get("phases", {})
+    return {
+        "mode": mode,
+        "wall_s": wall,
+        "requests": int(totals.get("requests", 0)),
+        "bytes_sent": int(totals.get("bytes_in", 0)),
+        "bytes_received": int(totals.get("bytes_out", 0)),
+        "rows_written": int(rows_written),
+        "rows_read": int(rows_read),
+        "rows_per_s": rows / wall if wall else 0.0,
+        "throttled": int(totals.get("throttled", 0)),
+        "phases": phases,
+    }
+
+
+def report(scale: str, phases: Dict[str, Any], runs: List[Dict[str, Any]]) -> None:
+    print(f"\n== {scale}: {phases['duo_rows']} vestigingen, {phases['metric_rows']} public metric rows")
+    print(
+        f"parse {phases['parse_s']:.2f}s ({phases['parse_rows_per_s']:.0f} rows/s) | "
+        f"snapshot {phases['snapshot_s']:.2f}s ({phases['schools']} schools) | "
+        f"match {phases['match_s']:.3f}s ({phases['matched']}/{phases['duo_rows']} matched)"
+    )
+    print(
+        f"{'mode':<18} {'wall s':>8} {'requests':>9} {'sent MB':>8} {'recv MB':>8} "
+        f"{'written':>9} {'read':>9} {'rows/s':>9} {'429s':>5}"
+    )
+    for r in runs:
+        print(
+            f"{r['mode']:<18} {r['wall_s']:>8.2f} {r['requests']:>9} {r['bytes_sent'] / 1e6:>8.2f} "
+            f"{r['bytes_received'] / 1e6:>8.2f} {r['rows_written']:>9} {r['rows_read']:>9} {r['rows_per_s']:>9.0f} "
+            f"{r['throttled']:>5}"
+        )
+        if r["phases"]:
+            print("    " + ", ".join(f"{name} {p['wall_s']:.2f}s" for name, p in r["phases"].items()))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", action="append", help="SCHOOLSxMETRICS (repeatable)")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed-format", choices=["xlsx", "csv", "tsv", "ndjson"], default="xlsx")
+    parser.add_argument("--workdir", default=os.path.join(BENCH_DIR, ".work"))
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(os.path.join(workdir, "scripts"), exist_ok=True)
+
+    results = []
+    for scale in args.scale or ["100x1000", "1000x100000"]:
+        schools, metric_rows = parse_scale(scale)
+        if args.seed_format == "xlsx":
+            seed = os.path.join(workdir, f"seed_{schools}x{metric_rows}.xlsx")
+        else:
+            seed = os.path.join(workdir, f"seed_{schools}x{metric_rows}_{args.seed_format}")
+        if not os.path.exists(seed):
+            if args.seed_format == "xlsx":
+                _, gen_s = timed(generate, seed, schools, metric_rows)
+            else:
+                _, gen_s = timed(generate_dir, seed, schools, metric_rows, args.seed_format)
+            print(f"Generated {seed} in {gen_s:.1f}s")
+        server = BenchServer(schools, args.latency_ms, args.throttle_rate)
+        try:
+            env = {
+                **os.environ,
+                "NEXT_PUBLIC_SUPABASE_URL": server.url,
+                "SUPABASE_SERVICE_ROLE_KEY": "bench",
+                "DUO_PARSE_CACHE": "0",
+                "DUO_CROSSWALK": "0",
+                "DUO_MATCH_FUZZY": "1",
+                "DUO_JOURNAL_PATH": os.path.join(workdir, "journal.jsonl"),
+                "DUO_UNMATCHED_OUTPUT": os.path.join(workdir, "unmatched.csv"),
+                "DUO_REVIEW_OUTPUT": os.path.join(workdir, "match_review.csv"),
+                "DUO_RUN_STATS_OUTPUT": os.path.join(workdir, "run_stats.json"),
+            }
+            phases = in_process_phases(server, seed)
+            runs = [run_mode(server, mode, seed, workdir, env) for mode in modes]
+        finally:
+            server.close()
+        report(scale, phases, runs)
+        results.append({"scale": scale, "phases": phases, "runs": runs})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
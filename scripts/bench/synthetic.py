@@ -0,0 +1,143 @@
+"""Deterministic synthetic DUO vestigingen and matching `schools` rows.
+
+Shared by the seed generator and the fake PostgREST server so a generated
+seed matches the served catalog through every matcher pass: some schools
+already carry their DUO id, some only share address, some only name +
+postcode, some have a slightly different name (fuzzy/spatial), and a few
+have no counterpart at all.
+"""
+
+from __future__ import annotations
+
+import random
+import uuid
+from typing import Any, Dict, List, Optional
+
+PREFIXES = ["Het", "De", "Sint", "Open", "Christelijk", "Montessori", "Dalton", "Vrije"]
+NAMES = [
+    "Lyceum",
+    "Gymnasium",
+    "College",
+    "Scholengemeenschap",
+    "Mavo",
+    "Havo",
+    "Academie",
+    "Campus",
+    "Leerhuis",
+    "Atheneum",
+]
+PLACES = ["Noord", "Zuid", "Oost", "West", "Centrum", "Nieuw-West", "Zuidoost", "IJburg", "Amstel", "Jordaan"]
+STREETS = ["Keizersgracht", "Overtoom", "Ferdinand Bolstraat", "Javastraat", "Linnaeusstraat", "Bos en Lommerweg"]
+DENOMINATIES = ["Openbaar", "Rooms-Katholiek", "Protestants-Christelijk", "Algemeen bijzonder"]
+
+SCHOOLS_HEADERS = [
+    "school_id",
+    "brin",
+    "vestiging_nr",
+    "vestigingsnaam",
+    "postcode",
+    "straat",
+    "huisnr_toev",
+    "denominatie",
+    "telefoon",
+    "website",
+    "include_in_main_db",
+    "public_use_ok",
+]
+METRICS_HEADERS = [
+    "school_id",
+    "metric_period",
+    "metric_group",
+    "metric_name",
+    "value",
+    "unit",
+    "notes",
+    "public_use_ok",
+    "source",
+]
+METRIC_GROUPS = ["pupils", "exams", "advice", "staff"]
+
+
+def vestiging(i: int) -> Dict[str, Any]:
+    """DUO-side fields for vestiging i (stable for a given i)."""
+    rng = random.Random(i)
+    brin = f"{i // 10:02d}{chr(65 + i % 26)}{chr(65 + (i // 26) % 26)}"
+    nr = f"{i % 10:02d}"
+    house = rng.randint(1, 400)
+    suffix = rng.choice(["", "", "", "A", "-2", " hs"])
+    return {
+        "school_id": f"{brin}{nr}",
+        "brin": brin,
+        "vestiging_nr": nr,
+        "vestigingsnaam": f"{rng.choice(PREFIXES)} {rng.choice(NAMES)} {PLACES[i % len(PLACES)]} {i}",
+        "postcode": f"{1000 + i % 110:04d} {chr(65 + i % 26)}{chr(65 + (i // 7) % 26)}",
+        "straat": rng.choice(STREETS),
+        "huisnr_toev": f"{house}{suffix}",
+        "denominatie": rng.choice(DENOMINATIES),
+        "telefoon": f"020-{rng.randint(1000000, 9999999)}",
+        "website": f"www.school{i}.nl",
+        "include_in_main_db": "1" if i % 50 else "0",
+        "public_use_ok": "YES (open data)",
+        "lat": 52.30 + rng.random() * 0.12,
+        "lng": 4.80 + rng.random() * 0.18,
+    }
+
+
+def existing_school(i: int) -> Optional[Dict[str, Any]]:
+    """The `schools` row that vestiging i should match, or None (unmatched)."""
+    v = vestiging(i)
+    kind = i % 10
+    if kind == 9:
+        return None
+    house_nr = "".join(ch for ch in v["huisnr_toev"] if ch.isdigit())
+    postcode = v["postcode"].replace(" ", "")
+    row: Dict[str, Any] = {
+        "id": str(uuid.UUID(int=i + 1)),
+        "name": v["vestigingsnaam"],
+        "address": f"{v['straat']} {v['huisnr_toev']}, {v['postcode']} Amsterdam",
+        "website_url": None,
+        "duo_school_id": None,
+        "postcode": None,
+        "street": None,
+        "house_nr": None,
+        "house_nr_suffix": None,
+        "lat": v["lat"],
+        "lng": v["lng"],
+        "source": "bench",
+        "source_id": f"bench-{i}",
+    }
+    if kind in (0, 1):
+        row["duo_school_id"] = v["school_id"]
+    elif kind in (2, 3):
+        row["postcode"] = postcode
+        row["house_nr"] = house_nr
+    elif kind == 4:
+        # Name + postcode only; the address string does not parse.
+        row["postcode"] = postcode
+        row["address"] = "Amsterdam"
+    elif kind in (5, 6):
+        # Renamed in the catalog; reachable through fuzzy or spatial matching.
+        row["name"] = v["vestigingsnaam"].replace(" ", " locatie ", 1)
+        row["address"] = f"{v['straat']}, Amsterdam"
+    return row
+
+
+def existing_schools(count: int) -> List[Dict[str, Any]]:
+    """`schools` rows for the first `count` vestigingen (unmatched ones are skipped)."""
+    rows = []
+    for i in range(count):
+        row = existing_school(i)
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def metric_value(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.75:
+        return str(rng.randint(0, 2000))
+    if roll < 0.9:
+        return f"{rng.random() * 10:.1f}"
+    if roll < 0.95:
+        return "Error: #VALUE!"
+    return rng.choice(["n.v.t.", "< 5", "onbekend"])
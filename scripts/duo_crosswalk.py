@@ -0,0 +1,82 @@
+"""Local SQLite crosswalk of DUO vestiging -> schools.id decisions.
+
+Each decision stores the matching method and a fingerprint of the inputs
+(see SchoolMatcher.fingerprint). A rerun reuses a decision as long as the
+fingerprint is unchanged and the target school still exists, so only new or
+changed DUO rows go through the matcher.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterable, NamedTuple, Optional
+
+SCHEMA = """
+create table if not exists duo_crosswalk (
+  duo_school_id text primary key,
+  school_id text not null,
+  method text not null,
+  fingerprint text not null,
+  decided_at text not null
+)
+"""
+
+
+class Decision(NamedTuple):
+    school_id: str
+    method: str
+    fingerprint: str
+
+
+class Crosswalk:
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(SCHEMA)
+        self._decisions: Optional[Dict[str, Decision]] = None
+
+    def __enter__(self) -> "Crosswalk":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def decisions(self) -> Dict[str, Decision]:
+        if self._decisions is None:
+            rows = self._conn.execute("select duo_school_id, school_id, method, fingerprint from duo_crosswalk")
+            self._decisions = {duo_id: Decision(school_id, method, fp) for duo_id, school_id, method, fp in rows}
+        return self._decisions
+
+    def lookup(self, duo_id: str, fingerprint: str) -> Optional[Decision]:
+        """The stored decision for `duo_id`, if it was made from the same inputs."""
+        decision = self.decisions().get(duo_id)
+        if decision is None or decision.fingerprint != fingerprint:
+            return None
+        return decision
+
+    def save(self, decided: Dict[str, Decision], dropped: Iterable[str] = ()) -> None:
+        """Upsert new/changed decisions and forget DUO ids that no longer match."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._conn:
+            self._conn.executemany(
+                "insert into duo_crosswalk (duo_school_id, school_id, method, fingerprint, decided_at) "
+                "values (?, ?, ?, ?, ?) "
+                "on conflict (duo_school_id) do update set school_id = excluded.school_id, "
+                "method = excluded.method, fingerprint = excluded.fingerprint, decided_at = excluded.decided_at",
+                [(duo_id, d.school_id, d.method, d.fingerprint, now) for duo_id, d in decided.items()],
+            )
+            self._conn.executemany(
+                "delete from duo_crosswalk where duo_school_id = ?", [(duo_id,) for duo_id in dropped]
+            )
+        known = self.decisions()
+        known.update(decided)
+        for duo_id in dropped:
+            known.pop(duo_id, None)
@@ -0,0 +1,88 @@
+"""Per-school summary of the latest DUO metrics (the `school_facts` table).
+
+One row per matched school:
+
+    {"school_id": ..., "duo_school_id": ..., "latest_period": "2024",
+     "facts": {metric_group: {metric_name: {"value": ..., "unit": ..., "period": ...}}},
+     "content_hash": ...}
+
+Each metric contributes its row for the most recent period, so the detail
+page reads one row by primary key instead of pivoting `school_metrics`.
+`content_hash` covers everything but the hash itself, so unchanged schools
+can be skipped on the next import.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import re
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from duo_metrics import MetricsTable
+
+DIGITS_RE = re.compile(r"\d+")
+
+
+def period_key(period: str) -> Tuple[Tuple[int, ...], str]:
+    """Sort key for periods like "2024", "2023-2024" or "2023/24": numbers first, then text."""
+    return tuple(int(n) for n in DIGITS_RE.findall(period)), period
+
+
+def facts_hash(row: Mapping[str, Any]) -> str:
+    content = json.dumps(
+        [row.get("duo_school_id"), row.get("latest_period"), row.get("facts")],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_facts(
+    metrics: MetricsTable, rows: Sequence[int], duo_to_school_id: Mapping[str, str]
+) -> List[Dict[str, Any]]:
+    """school_facts rows for the schools of `rows` (matched metric row indices)."""
+    cols = metrics.columns
+    # (school id, group, name) -> (period key, row index); later rows win ties.
+    latest: Dict[Tuple[str, str, str], Tuple[Tuple[Tuple[int, ...], str], int]] = {}
+    duo_ids: Dict[str, str] = {}
+    for i in rows:
+        duo_id = cols["school_id"][i]
+        school_id = duo_to_school_id[duo_id]
+        duo_ids[school_id] = duo_id
+        key = (school_id, cols["metric_group"][i] or "", cols["metric_name"][i] or "")
+        pkey = period_key(cols["metric_period"][i] or "")
+        current = latest.get(key)
+        if current is None or pkey >= current[0]:
+            latest[key] = (pkey, i)
+
+    by_school: Dict[str, Dict[str, Any]] = {}
+    for (school_id, group, name), (pkey, i) in latest.items():
+        entry = by_school.setdefault(school_id, {"facts": {}, "latest": None})
+        value_numeric = metrics.value_numeric[i]
+        value = metrics.value_text[metrics.raw_value.codes[i]] if math.isnan(value_numeric) else value_numeric
+        fact: Dict[str, Any] = {"value": value, "period": pkey[1] or None}
+        if cols["unit"][i]:
+            fact["unit"] = cols["unit"][i]
+        entry["facts"].setdefault(group, {})[name] = fact
+        if pkey[1] and (entry["latest"] is None or pkey > entry["latest"]):
+            entry["latest"] = pkey
+
+    facts = []
+    for school_id in sorted(by_school):
+        entry = by_school[school_id]
+        row = {
+            "school_id": school_id,
+            "duo_school_id": duo_ids[school_id],
+            "latest_period": entry["latest"][1] if entry["latest"] else None,
+            "facts": entry["facts"],
+        }
+        row["content_hash"] = facts_hash(row)
+        facts.append(row)
+    return facts
+
+
+def changed_facts(facts: Sequence[Dict[str, Any]], existing: Mapping[str, str]) -> List[Dict[str, Any]]:
+    """Rows whose content hash differs from `existing` (school_id -> stored hash)."""
+    return [row for row in facts if existing.get(row["school_id"]) != row["content_hash"]]
@@ -0,0 +1,327 @@
+"""Columnar in-memory table for the Metrics_long sheet.
+
+Each string column interns its values (metric_group, metric_name, unit and
+source repeat heavily), `value` is decoded once per distinct raw string into a
+compact float array, and row dicts are only built when a payload is
+serialized. `row_json` skips the dicts entirely: each distinct string value is
+JSON-encoded once and rows are joined from those cached fragments.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+ERROR_VALUE = "Error: #VALUE!"
+
+REQUIRED_COLUMNS = [
+    "school_id",
+    "metric_period",
+    "metric_group",
+    "metric_name",
+    "value",
+    "unit",
+    "notes",
+    "public_use_ok",
+    "source",
+]
+
+NAN = float("nan")
+
+# school_metrics columns identifying a metric, and those making up its content.
+METRIC_KEY_FIELDS = ["school_id", "metric_group", "metric_name", "period"]
+# Every field a payload row can carry; write with ?columns= so omitted (null) fields are stored as NULL.
+PAYLOAD_FIELDS = [
+    "school_id",
+    "duo_school_id",
+    "metric_group",
+    "metric_name",
+    "period",
+    "value_numeric",
+    "value_text",
+    "unit",
+    "notes",
+    "source",
+    "public_use_ok",
+]
+
+# Payload field <- string column, for the fragments row_json caches per distinct value.
+FRAGMENT_FIELDS = [
+    ("duo_school_id", "school_id"),
+    ("metric_group", "metric_group"),
+    ("metric_name", "metric_name"),
+    ("period", "metric_period"),
+    ("unit", "unit"),
+    ("notes", "notes"),
+    ("source", "source"),
+    ("public_use_ok", "public_use_ok"),
+]
+
+CONTENT_FIELDS = ["duo_school_id", "value_numeric", "value_text", "unit", "notes", "source", "public_use_ok"]
+
+MetricKey = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+def to_float(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    if value == ERROR_VALUE:
+        return None
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
+class StringColumn:
+    """Dictionary-encoded column: distinct values once, one uint32 code per row."""
+
+    def __init__(self) -> None:
+        self.values: List[Optional[str]] = [None]
+        self.codes = array("I")
+        self._lookup: Dict[Optional[str], int] = {None: 0}
+
+    def append(self, value: Optional[str]) -> None:
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        return self.values[self.codes[i]]
+
+
+class MetricsTable:
+    STRING_COLUMNS = [
+        "school_id",
+        "metric_period",
+        "metric_group",
+        "metric_name",
+        "unit",
+        "notes",
+        "source",
+        "public_use_ok",
+    ]
+
+    def __init__(self) -> None:
+        self.columns = {name: StringColumn() for name in self.STRING_COLUMNS}
+        self.raw_value = StringColumn()
+        self.value_numeric = array("d")
+        # Decoded text per distinct raw value (indexed by raw_value code).
+        self.value_text: List[Optional[str]] = []
+        # Encoded `,"field":value` per (field, code); b"" for null.
+        self._fragments: Dict[Tuple[str, int], bytes] = {}
+
+    @classmethod
+    def from_rows(cls, index: Mapping[str, int], rows: Iterable[List[Optional[str]]]) -> "MetricsTable":
+        """Build from Metrics_long rows, keeping only rows marked public_use_ok YES."""
+        table = cls()
+        table.extend(index, rows)
+        table.decode_values()
+        return table
+
+    def extend(self, index: Mapping[str, int], rows: Iterable[List[Optional[str]]]) -> None:
+        """Append public Metrics_long rows (column positions from `index`); call decode_values() after."""
+        targets = [(self.columns[name], index[name]) for name in self.STRING_COLUMNS]
+        raw_value = self.raw_value
+        value_i = index["value"]
+        public_i = index["public_use_ok"]
+        for r in rows:
+            if "YES" not in (r[public_i] or ""):
+                continue
+            for col, i in targets:
+                col.append(r[i])
+            raw_value.append(r[value_i])
+
+    def merge_sources(self, starts: Sequence[int]) -> int:
+        """Drop rows whose (duo id, group, name, period) also appears in a later source.
+
+        `starts` are the row offsets where each source (workbook) begins. For
+        every key the rows of the last source containing it are kept, so one
+        workbook's own repeated keys are left alone. Returns the rows dropped.
+        """
+        key_names = ("school_id", "metric_group", "metric_name", "metric_period")
+        key_columns = [self.columns[name].codes for name in key_names]
+        bounds = list(starts[1:]) + [len(self)]
+        owner: Dict[Tuple[int, ...], int] = {}
+        source = 0
+        for i, key in enumerate(zip(*key_columns)):
+            while i >= bounds[source]:
+                source += 1
+            owner[key] = source
+        keep = []
+        source = 0
+        for i, key in enumerate(zip(*key_columns)):
+            while i >= bounds[source]:
+                source += 1
+            if owner[key] == source:
+                keep.append(i)
+        dropped = len(self) - len(keep)
+        if dropped:
+            for col in list(self.columns.values()) + [self.raw_value]:
+                codes = col.codes
+                col.codes = array("I", [codes[i] for i in keep])
+        return dropped
+
+    def decode_values(self) -> None:
+        """Parse `value` once per distinct raw string, then expand by code."""
+        numeric: List[float] = []
+        text: List[Optional[str]] = []
+        for raw in self.raw_value.values:
+            number = to_float(raw)
+            numeric.append(NAN if number is None else number)
+            text.append(None if number is not None or raw == ERROR_VALUE else raw)
+        self.value_numeric = array("d", [numeric[c] for c in self.raw_value.codes])
+        self.value_text = text
+        self._fragments.clear()
+
+    def __len__(self) -> int:
+        return len(self.raw_value)
+
+    def periods(self) -> List[str]:
+        """Distinct metric periods present in the table, sorted."""
+        column = self.columns["metric_period"]
+        return sorted({column.values[code] or "" for code in set(column.codes)} - {""})
+
+    def matched_rows(self, duo_to_school_id: Mapping[str, str]) -> "array[int]":
+        """Row indices whose DUO id was matched to a school."""
+        col = self.columns["school_id"]
+        matched = [bool(v and v in duo_to_school_id) for v in col.values]
+        return array("I", [i for i, code in enumerate(col.codes) if matched[code]])
+
+    def rows_by_school(self, rows: Sequence[int], duo_to_school_id: Mapping[str, str]) -> Dict[str, List[int]]:
+        col = self.columns["school_id"]
+        grouped: Dict[str, List[int]] = defaultdict(list)
+        for i in rows:
+            grouped[duo_to_school_id[col[i]]].append(i)
+        return grouped
+
+    def matched_school_ids(self, duo_to_school_id: Mapping[str, str]) -> List[str]:
+        present = set(self.columns["school_id"].codes)
+        duo_ids = self.columns["school_id"].values
+        return sorted({duo_to_school_id[duo_ids[c]] for c in present if duo_ids[c] in duo_to_school_id})
+
+    def payload(self, i: int, duo_to_school_id: Mapping[str, str]) -> Dict[str, Any]:
+        cols = self.columns
+        duo_id = cols["school_id"][i]
+        value_numeric = self.value_numeric[i]
+        return {
+            "school_id": duo_to_school_id[duo_id],
+            "duo_school_id": duo_id,
+            "metric_group": cols["metric_group"][i],
+            "metric_name": cols["metric_name"][i],
+            "period": cols["metric_period"][i],
+            "value_numeric": None if math.isnan(value_numeric) else value_numeric,
+            "value_text": self.value_text[self.raw_value.codes[i]],
+            "unit": cols["unit"][i],
+            "notes": cols["notes"][i],
+            "source": cols["source"][i],
+            "public_use_ok": cols["public_use_ok"][i],
+        }
+
+    def _fragment(self, field: str, code: int, value: Optional[str]) -> bytes:
+        key = (field, code)
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            fragment = b"" if value is None else f',"{field}":{json.dumps(value)}'.encode("utf-8")
+            self._fragments[key] = fragment
+        return fragment
+
+    def row_json(self, i: int, duo_to_school_id: Mapping[str, str], metric_id: Optional[str] = None) -> bytes:
+        """payload(i) (plus "id" when given) as compact JSON, leaving out null fields.
+
+        Send with `?columns=` (PAYLOAD_FIELDS) so PostgREST stores the omitted
+        fields as NULL instead of taking the column list from the first row.
+        """
+        cols = self.columns
+        duo_id = cols["school_id"][i]
+        parts = [f'{{"school_id":"{duo_to_school_id[duo_id]}"'.encode("utf-8")]
+        if metric_id is not None:
+            parts.append(f',"id":"{metric_id}"'.encode("utf-8"))
+        for field, name in FRAGMENT_FIELDS:
+            col = cols[name]
+            code = col.codes[i]
+            parts.append(self._fragment(field, code, col.values[code]))
+        value_numeric = self.value_numeric[i]
+        if not math.isnan(value_numeric):
+            parts.append(b',"value_numeric":' + json.dumps(value_numeric).encode("utf-8"))
+        raw_code = self.raw_value.codes[i]
+        parts.append(self._fragment("value_text", raw_code, self.value_text[raw_code]))
+        parts.append(b"}")
+        return b"".join(parts)
+
+
+def metric_key(row: Mapping[str, Any]) -> MetricKey:
+    return (row.get("school_id"), row.get("metric_group"), row.get("metric_name"), row.get("period"))
+
+
+def content_hash(row: Mapping[str, Any]) -> str:
+    """Hash of the CONTENT_FIELDS of a seed payload or a school_metrics row.
+
+    value_numeric is compared as a float: the seed holds 12.0 where PostgREST
+    returns an integral float8 as 12, and both must hash the same.
+
+    >>> seed = {"duo_school_id": "00AA01", "value_numeric": 12.0, "unit": "aantal"}
+    >>> content_hash(seed) == content_hash({**seed, "value_numeric": 12})
+    True
+    """
+    values = [row.get(f) for f in CONTENT_FIELDS]
+    values = [float(v) if f == "value_numeric" and v is not None else v for f, v in zip(CONTENT_FIELDS, values)]
+    content = json.dumps(values, separators=(",", ":"))
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class MetricsDiff:
+    def __init__(self) -> None:
+        self.inserts = array("I")
+        self.updates: List[Tuple[int, str]] = []
+        self.deletes: List[str] = []
+        self.unchanged = 0
+
+    def extend(self, other: "MetricsDiff") -> None:
+        self.inserts.extend(other.inserts)
+        self.updates.extend(other.updates)
+        self.deletes.extend(other.deletes)
+        self.unchanged += other.unchanged
+
+
+def diff_metrics(
+    table: MetricsTable,
+    rows: Iterable[int],
+    duo_to_school_id: Mapping[str, str],
+    existing: Iterable[Mapping[str, Any]],
+) -> MetricsDiff:
+    """Compare desired rows (table indices) against existing school_metrics rows.
+
+    Rows are keyed by (school_id, metric_group, metric_name, period); repeated
+    keys are paired in order. Existing rows must cover the same schools as
+    `rows`, otherwise their metrics are reported as deletes.
+    """
+    desired: Dict[MetricKey, List[int]] = defaultdict(list)
+    for i in rows:
+        desired[metric_key(table.payload(i, duo_to_school_id))].append(i)
+    current: Dict[MetricKey, List[Mapping[str, Any]]] = defaultdict(list)
+    for row in existing:
+        current[metric_key(row)].append(row)
+
+    diff = MetricsDiff()
+    for key, wanted in desired.items():
+        have = sorted(current.pop(key, []), key=lambda r: r["id"])
+        for i, row in zip(wanted, have):
+            if content_hash(table.payload(i, duo_to_school_id)) == content_hash(row):
+                diff.unchanged += 1
+            else:
+                diff.updates.append((i, row["id"]))
+        diff.inserts.extend(wanted[len(have) :])
+        diff.deletes.extend(r["id"] for r in have[len(wanted) :])
+    for leftover in current.values():
+        diff.deletes.extend(r["id"] for r in leftover)
+    return diff
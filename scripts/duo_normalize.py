@@ -0,0 +1,113 @@
+"""Normalization helpers for matching DUO rows against app schools.
+
+Patterns are compiled once and every helper is memoized in a bounded LRU
+cache: seeds repeat the same names, postcodes and addresses across rows (and
+across school years), so the work scales with distinct values. Results are
+immutable (str, tuple, frozenset) and safe to share. `normalize_column`
+maps a helper over a whole column, calling it once per distinct value, and
+`cache_stats()` reports hits and misses per helper.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Entries per helper; a few MB at most even for multi-city, multi-year seeds.
+CACHE_SIZE = 1 << 16
+
+NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+WHITESPACE_RE = re.compile(r"\s+")
+HOUSE_NR_RE = re.compile(r"^(\d+)(.*)$")
+# Dutch postcode pattern: 1234AB (with optional space)
+POSTCODE_RE = re.compile(r"(\d{4})\s*([A-Za-z]{2})")
+# House number: digits possibly followed by letters or suffix
+ADDRESS_HOUSE_RE = re.compile(r"\b(\d{1,5})\s*([A-Za-z]{0,3})\b")
+
+_CACHED: Dict[str, Any] = {}
+
+
+def cached(fn: Callable[..., T]) -> Callable[..., T]:
+    """Memoize `fn` (hashable args, immutable result) and report it in cache_stats()."""
+    wrapper = lru_cache(maxsize=CACHE_SIZE)(fn)
+    _CACHED[fn.__name__] = wrapper
+    return wrapper
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """{helper: {hits, misses, size}} for every memoized helper that has been called."""
+    stats = {}
+    for name, fn in _CACHED.items():
+        info = fn.cache_info()
+        if info.hits or info.misses:
+            stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
+
+
+def clear_caches() -> None:
+    for fn in _CACHED.values():
+        fn.cache_clear()
+
+
+def normalize_column(fn: Callable[[Any], T], values: Iterable[Any]) -> List[T]:
+    """[fn(v) for v in values], calling fn once per distinct value."""
+    values = list(values)
+    results = {v: fn(v) for v in dict.fromkeys(values)}
+    return [results[v] for v in values]
+
+
+@cached
+def norm_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    s = value.lower().strip()
+    s = s.replace("&", " en ")
+    s = NON_ALNUM_RE.sub(" ", s)
+    s = WHITESPACE_RE.sub(" ", s)
+    return s.strip()
+
+
+@cached
+def norm_postcode(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    return WHITESPACE_RE.sub("", value).upper()
+
+
+@cached
+def parse_house_nr(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    if not value:
+        return None, None
+    raw = value.strip()
+    m = HOUSE_NR_RE.match(raw)
+    if not m:
+        return raw, None
+    num = m.group(1)
+    suffix = m.group(2).strip() or None
+    return num, suffix
+
+
+@cached
+def parse_address_components(address: Optional[str]) -> Tuple[str, Optional[str]]:
+    if not address:
+        return "", None
+    raw = address.strip()
+    m = POSTCODE_RE.search(raw)
+    postcode = ""
+    if m:
+        postcode = f"{m.group(1)}{m.group(2)}".upper()
+    n = ADDRESS_HOUSE_RE.search(raw)
+    if not n:
+        return postcode, None
+    nr = n.group(1)
+    suffix = n.group(2) or ""
+    return postcode, f"{nr}{suffix}".strip()
+
+
+@cached
+def street_tokens(value: Optional[str]) -> FrozenSet[str]:
+    """Normalized street/address words usable for blocking (no house numbers or single letters)."""
+    return frozenset(t for t in norm_text(value).split() if not t.isdigit() and len(t) > 1)
@@ -4,27 +4,50 @@
 Requires env vars:
   - NEXT_PUBLIC_SUPABASE_URL
   - SUPABASE_SERVICE_ROLE_KEY
+
+Optional env vars:
+  - EXPORT_STREAM=1 (copy PostgREST's CSV pages straight to the file, keyset-paginated on id)
+  - EXPORT_COLUMNS (PostgREST select list, default school_id:id,name,address,website_url)
+  - EXPORT_FILTERS (PostgREST filters as a query string, e.g. source=eq.schoolwijzer&lat=not.is.null)
+  - EXPORT_OUTPUT (default scripts/schools_id_map.csv; a .gz name writes gzip)
+  - EXPORT_PAGE_SIZE=N (rows per request, default 1000)
+  - EXPORT_FETCH_WORKERS=N (concurrent page requests, default 4; JSON mode only)
+  - SUPABASE_HTTP_POOL_SIZE, SUPABASE_HTTP_RETRIES (keep-alive pool + retry budget)
 """
 
 import csv
-import json
+import gzip
+import io
 import os
 import urllib.parse
-import urllib.request
-import urllib.error
+from typing import IO, List, Tuple
+
+from supabase_rest import RestClient, fetch_csv_pages, fetch_pages
+
+DEFAULT_COLUMNS = "school_id:id,name,address,website_url"
+
 
+def parse_columns(select: str) -> List[Tuple[str, str]]:
+    """(output name, source column) per item of a PostgREST select list."""
+    columns = []
+    for item in select.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        alias, sep, rest = item.partition(":")
+        # "alias:column" renames; "column::type" is a cast and keeps the column name.
+        if sep and not rest.startswith(":"):
+            columns.append((alias, rest.split("::", 1)[0]))
+        else:
+            source = item.split("::", 1)[0]
+            columns.append((source, source))
+    return columns
 
-def http_request(url: str, headers: dict) -> list:
-    req = urllib.request.Request(url, headers=headers)
-    try:
-        with urllib.request.urlopen(req) as resp:
-            data = resp.read()
-            if not data:
-                return []
-            return json.loads(data.decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        details = e.read().decode("utf-8")
-        raise RuntimeError(f"HTTP {e.code} {e.reason} - {details}") from e
+
+def open_output(path: str) -> IO[bytes]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb", compresslevel=6)
+    return open(path, "wb")
 
 
 def main() -> None:
@@ -38,28 +61,52 @@ def main() -> None:
         "Authorization": f"Bearer {service_key}",
     }
 
-    params = urllib.parse.urlencode(
-        {
-            "select": "id,name,address,website_url",
-            "limit": "1000",
-            "order": "name.asc",
-        }
+    select = os.getenv("EXPORT_COLUMNS") or DEFAULT_COLUMNS
+    columns = parse_columns(select)
+    filters = dict(urllib.parse.parse_qsl(os.getenv("EXPORT_FILTERS") or "", keep_blank_values=True))
+    output = os.getenv("EXPORT_OUTPUT") or "scripts/schools_id_map.csv"
+    page_size = int(os.getenv("EXPORT_PAGE_SIZE") or "1000")
+    stream = os.getenv("EXPORT_STREAM") == "1"
+    workers = int(os.getenv("EXPORT_FETCH_WORKERS") or "4")
+    client = RestClient(
+        f"{supabase_url}/rest/v1",
+        headers,
+        pool_size=int(os.getenv("SUPABASE_HTTP_POOL_SIZE") or str(workers)),
+        max_retries=int(os.getenv("SUPABASE_HTTP_RETRIES") or "4"),
     )
-    url = f"{supabase_url}/rest/v1/schools?{params}"
-    rows = http_request(url, headers)
-
-    with open("scripts/schools_id_map.csv", "w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["school_id", "name", "address", "website_url"])
-        for r in rows:
-            writer.writerow([
-                r.get("id", ""),
-                r.get("name", ""),
-                r.get("address", ""),
-                r.get("website_url", ""),
-            ])
-
-    print("Wrote scripts/schools_id_map.csv")
+
+    count = 0
+    with open_output(output) as f:
+        if stream:
+            key_field = next((name for name, source in columns if source == "id"), None)
+            if key_field is None:
+                raise SystemExit("EXPORT_COLUMNS must include id when EXPORT_STREAM=1 (keyset pagination)")
+            params = {**filters, "select": select}
+            wrote_header = False
+            for chunk, rows in fetch_csv_pages(client, "schools", params, "id", key_field, page_size):
+                f.write(chunk)
+                wrote_header = True
+                count += rows
+            if not wrote_header:
+                f.write((",".join(name for name, _ in columns) + "\n").encode("utf-8"))
+        else:
+            params = {
+                **filters,
+                "select": select,
+                # id breaks ties so offset pages never overlap or skip rows.
+                "order": "name.asc,id.asc",
+            }
+            text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow([name for name, _ in columns])
+            for page in fetch_pages(client, "schools", params, page_size=page_size, workers=workers):
+                for r in page:
+                    writer.writerow([r.get(name, "") for name, _ in columns])
+                count += len(page)
+            text.flush()
+            text.detach()
+
+    print(f"Wrote {output} ({count} schools)")
 
 
 if __name__ == "__main__":
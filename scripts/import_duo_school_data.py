@@ -6,170 +6,177 @@ Requires env vars:
   - SUPABASE_SERVICE_ROLE_KEY
 
 Usage:
-  python3 scripts/import_duo_school_data.py /path/to/amsterdam_vo_schools_seed.xlsx
+  python3 scripts/import_duo_school_data.py /path/to/amsterdam_vo_schools_seed.xlsx [--resume]
+  python3 scripts/import_duo_school_data.py 'seeds/*.xlsx' [more.xlsx ...] [--resume]
+  python3 scripts/import_duo_school_data.py /path/to/seed_dir [--resume]
+  python3 scripts/import_duo_school_data.py plan /path/to/seed.xlsx [...] --out /path/to/plan.jsonl[.gz]
+  python3 scripts/import_duo_school_data.py apply /path/to/plan.jsonl[.gz] [--resume]
+
+  `plan` parses, matches and diffs (reads only) and writes every school update,
+  metric insert/update/delete, changed school_facts row and unmatched row to a
+  plan file; `apply` executes a plan. Without a command both steps run in one go.
+  Several workbooks (paths or quoted globs, e.g. one per school year) are
+  parsed in parallel and imported against one schools snapshot; later
+  workbooks win for the same DUO vestiging or metric key.
+  A seed directory holds plain-text sheet exports instead of an xlsx:
+  Schools_AMS_main.csv + Metrics_long.csv (or .tsv / .ndjson, optionally .gz).
+  --resume continues an interrupted run from its journal, skipping writes
+  that already completed.
 
 Optional env vars:
   - DUO_IMPORT_DRY_RUN=1 (no writes)
   - DUO_MATCH_NAME_ONLY=1 (allow name-only matches when unique)
+  - DUO_MATCH_FUZZY=1 (allow fuzzy matches), DUO_MATCH_FUZZY_THRESHOLD (default 0.75)
+  - DUO_REVIEW_OUTPUT (name-only/spatial/fuzzy pairs with scores, default scripts/duo_match_review.csv)
+  - DUO_POSTCODE_CENTROIDS=path.csv (postcode,lat,lng; enables spatial matching)
+  - DUO_MATCH_RADIUS_M (spatial search radius, default 300)
+  - DUO_CROSSWALK=0 (re-match every row), DUO_CROSSWALK_PATH (saved match decisions)
+  - DUO_PARSE_WORKERS=N (parse sheets in N worker processes)
+  - DUO_PARSE_CACHE=0 (bypass the parsed-sheet cache)
+  - DUO_PARSE_CACHE_DIR, DUO_PARSE_CACHE_MAX_MB (cache location + size cap)
+  - DUO_FETCH_WORKERS=N (concurrent page requests for snapshots)
+  - DUO_UPDATE_BATCH_SIZE=N (school updates per bulk RPC call)
+  - DUO_WRITE_CONCURRENCY=N (metric write batches in flight)
+  - DUO_METRICS_SYNC=diff|full (write only changed metrics, or delete + reinsert)
+  - DUO_SYNC_CHUNK_SIZE=N (schools per metrics fetch/delete request)
+  - DUO_PIPELINE=1 (overlap parsing with the snapshot fetch, and diffing with writes)
+  - DUO_PIPELINE_QUEUE_SIZE=N (school chunks buffered per write queue, default 4)
+  - DUO_JOURNAL=0 (no write journal), DUO_JOURNAL_PATH (journal location)
+  - DUO_SCHOOL_FACTS=0 (skip the school_facts summary stage)
+  - DUO_RUN_STATS_OUTPUT=path.json (also write the run stats summary to a file)
+  - DUO_RECORD_RUN=0 (do not record the run in data_sync_runs), DUO_SCHOOL_YEAR_LABEL (e.g. 2025/26)
+  - DUO_TRACE_MEMORY=1 (tracemalloc peak), DUO_PROFILE_OUTPUT=path.prof (cProfile dump)
+  - SUPABASE_HTTP_POOL_SIZE, SUPABASE_HTTP_RETRIES (keep-alive pool + retry budget)
+  - SUPABASE_GZIP_REQUESTS=1 (gzip request bodies; falls back to plain on 400/415)
 """
 
 from __future__ import annotations
 
+import asyncio
+import csv
+import glob
 import json
 import os
-import re
+import queue
 import sys
+import threading
 import time
 import urllib.parse
-import urllib.request
-import zipfile
-import xml.etree.ElementTree as ET
-from collections import defaultdict
-from typing import Any, Dict, List, Optional, Tuple
-
-NS = {
-    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
-    "rel": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-    "pkgrel": "http://schemas.openxmlformats.org/package/2006/relationships",
-}
-
-ERROR_VALUE = "Error: #VALUE!"
-
-
-def die(msg: str) -> None:
-    print(msg, file=sys.stderr)
-    sys.exit(1)
-
-
-def read_shared_strings(z: zipfile.ZipFile) -> Optional[List[str]]:
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, NoReturn, Optional, Sequence, Tuple, TypeVar, Union
+
+from duo_crosswalk import Crosswalk, Decision
+from duo_facts import build_facts, changed_facts
+from duo_metrics import (
+    CONTENT_FIELDS,
+    ERROR_VALUE,
+    METRIC_KEY_FIELDS,
+    PAYLOAD_FIELDS,
+    REQUIRED_COLUMNS as REQUIRED_METRIC_COLUMNS,
+    MetricsDiff,
+    MetricsTable,
+    diff_metrics,
+)
+from duo_normalize import cache_stats, norm_postcode, parse_house_nr
+from import_journal import ImportJournal, JournalMismatch, idempotency_key
+from import_plan import ImportPlan, PlanError, PlanReader, open_plan, write_plan
+from parse_cache import ParseCache, file_digest
+from run_stats import RunStats
+from school_matcher import FUZZY, MANUAL, NAME_ONLY, SPATIAL, MatchResult, SchoolMatcher, read_postcode_centroids
+from supabase_rest import JSON_SEPARATORS, AdaptiveBatchWriter, HttpError, RestClient, WriteStats, fetch_pages
+from seed_reader import Seed, open_seed, read_seed_sheet, seed_digest
+from xlsx_reader import Row, SheetDataBuilder, SheetNotFound, parse_workbooks_parallel
+
+T = TypeVar("T")
+
+# Ids per DELETE ... ?id=in.(...) request; keeps URLs well under proxy limits.
+DELETE_CHUNK_SIZE = 200
+
+# Match methods without an exact key; their pairs go to the review CSV.
+REVIEW_METHODS = (NAME_ONLY, SPATIAL, FUZZY)
+
+
+def die(msg: str) -> NoReturn:
+    # Prints msg to stderr and exits 1; the message stays on the SystemExit for the run record.
+    sys.exit(msg)
+
+
+class SeedError(ValueError):
+    """A seed is missing a sheet or column; raised (not die()) so it can cross worker threads."""
+
+
+def open_sheet(seed: Seed, sheet_name: str) -> Tuple[List[str], Iterator[Row]]:
     try:
-        sst = ET.fromstring(z.read("xl/sharedStrings.xml"))
-    except KeyError:
-        return None
-    strings: List[str] = []
-    for si in sst.findall("main:si", NS):
-        texts = [t.text or "" for t in si.findall(".//main:t", NS)]
-        strings.append("".join(texts))
-    return strings
-
-
-def cell_value(c: ET.Element, shared_strings: Optional[List[str]]) -> Optional[str]:
-    t = c.attrib.get("t")
-    if t == "inlineStr":
-        is_elem = c.find("main:is", NS)
-        if is_elem is None:
-            return None
-        texts = [t.text or "" for t in is_elem.findall(".//main:t", NS)]
-        return "".join(texts)
-    v = c.find("main:v", NS)
-    if v is None:
-        return None
-    value = v.text
-    if value is None:
-        return None
-    if t == "s" and shared_strings is not None:
+        return seed.sheet(sheet_name)
+    except SheetNotFound:
+        raise SeedError(f"Sheet not found: {sheet_name}") from None
+
+
+def load_seed_sheets(
+    paths: Sequence[str],
+    sheet_names: List[str],
+    workers: int,
+    stack: ExitStack,
+    cache: Optional[ParseCache] = None,
+) -> List[Dict[str, Tuple[List[str], Iterator[Row]]]]:
+    """Headers + rows of `sheet_names` for each seed in `paths` (same order).
+
+    Seeds opened for streaming are registered on `stack`; consume the rows
+    before it closes.
+
+    A seed is an .xlsx workbook or a directory of per-sheet CSV/TSV/NDJSON
+    files (see seed_reader). With several seeds and no explicit worker count,
+    uncached sheets of all seeds are parsed in one process pool.
+    """
+    loaded: List[Dict[str, Tuple[List[str], Iterator[Row]]]] = [{} for _ in paths]
+    digests = [seed_digest(path) if cache else "" for path in paths]
+    missing: List[Tuple[int, str]] = []
+    for n, path in enumerate(paths):
+        for name in sheet_names:
+            cached = cache.get(digests[n], name) if cache else None
+            if cached is not None:
+                loaded[n][name] = (cached.headers, iter(cached))
+            else:
+                missing.append((n, name))
+    if not missing:
+        return loaded
+
+    if workers == 0 and len(paths) > 1:
+        workers = os.cpu_count() or 1
+    if workers > 1:
         try:
-            return shared_strings[int(value)]
-        except Exception:
-            return value
-    return value
-
-
-def col_key(c: str) -> int:
-    n = 0
-    for ch in c:
-        n = n * 26 + (ord(ch) - ord("A") + 1)
-    return n
-
-
-def load_sheet(path: str, sheet_name: str) -> Tuple[List[str], List[List[Optional[str]]]]:
-    with zipfile.ZipFile(path) as z:
-        wb = ET.fromstring(z.read("xl/workbook.xml"))
-        rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
-        rel_map = {r.attrib["Id"]: r.attrib["Target"] for r in rels.findall("pkgrel:Relationship", NS)}
-
-        sheet_target = None
-        for s in wb.findall("main:sheets/main:sheet", NS):
-            if s.attrib["name"] == sheet_name:
-                rel_id = s.attrib.get(f"{{{NS['rel']}}}id")
-                sheet_target = rel_map.get(rel_id)
-                break
-        if not sheet_target:
-            die(f"Sheet not found: {sheet_name}")
-
-        shared_strings = read_shared_strings(z)
-        sheet_path = sheet_target.lstrip("/")
-        root = ET.fromstring(z.read(sheet_path))
-        rows = root.findall("main:sheetData/main:row", NS)
-        if not rows:
-            return [], []
-
-        header_row = rows[0]
-        cells = header_row.findall("main:c", NS)
-        cols: List[str] = []
-        header_map: Dict[str, Optional[str]] = {}
-        for c in cells:
-            ref = c.attrib.get("r", "")
-            col = "".join(ch for ch in ref if ch.isalpha())
-            cols.append(col)
-            header_map[col] = cell_value(c, shared_strings)
-        cols.sort(key=col_key)
-        headers = [header_map.get(c) or "" for c in cols]
-
-        data_rows: List[List[Optional[str]]] = []
-        for r in rows[1:]:
-            row_map: Dict[str, Optional[str]] = {}
-            for c in r.findall("main:c", NS):
-                ref = c.attrib.get("r", "")
-                col = "".join(ch for ch in ref if ch.isalpha())
-                row_map[col] = cell_value(c, shared_strings)
-            data_rows.append([row_map.get(c) for c in cols])
-        return headers, data_rows
-
-
-def norm_text(value: Optional[str]) -> str:
-    if not value:
-        return ""
-    s = value.lower().strip()
-    s = s.replace("&", " en ")
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
-
-
-def norm_postcode(value: Optional[str]) -> str:
-    if not value:
-        return ""
-    return re.sub(r"\s+", "", value).upper()
-
-
-def parse_house_nr(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
-    if not value:
-        return None, None
-    raw = value.strip()
-    m = re.match(r"^(\d+)(.*)$", raw)
-    if not m:
-        return raw, None
-    num = m.group(1)
-    suffix = m.group(2).strip() or None
-    return num, suffix
-
-def parse_address_components(address: Optional[str]) -> Tuple[str, Optional[str]]:
-    if not address:
-        return "", None
-    raw = address.strip()
-    # Dutch postcode pattern: 1234AB (with optional space)
-    m = re.search(r"(\d{4})\s*([A-Za-z]{2})", raw)
-    postcode = ""
-    if m:
-        postcode = f"{m.group(1)}{m.group(2)}".upper()
-    # House number: digits possibly followed by letters or suffix
-    n = re.search(r"\b(\d{1,5})\s*([A-Za-z]{0,3})\b", raw)
-    if not n:
-        return postcode, None
-    nr = n.group(1)
-    suffix = n.group(2) or ""
-    return postcode, f"{nr}{suffix}".strip()
+            parsed = parse_workbooks_parallel([(paths[n], name) for n, name in missing], workers, read_seed_sheet)
+        except SheetNotFound as e:
+            raise SeedError(f"Sheet not found: {e.args[0]}") from None
+        for n, name in missing:
+            data = parsed[(paths[n], name)]
+            if cache:
+                cache.put(digests[n], name, data)
+            loaded[n][name] = (data.headers, iter(data))
+        return loaded
+
+    # One handle per seed: an xlsx's workbook.xml, rels and shared strings are parsed once.
+    seeds: Dict[int, Seed] = {}
+    for n, name in missing:
+        if n not in seeds:
+            seeds[n] = stack.enter_context(open_seed(paths[n]))
+        headers, rows = open_sheet(seeds[n], name)
+        if cache:
+            rows = cache_rows(cache, digests[n], name, headers, rows)
+        loaded[n][name] = (headers, rows)
+    return loaded
+
+
+def cache_rows(
+    cache: ParseCache, digest: str, sheet_name: str, headers: List[str], rows: Iterator[Row]
+) -> Iterator[Row]:
+    """Pass rows through unchanged, storing the sheet once it has been read to the end."""
+    builder = SheetDataBuilder(headers)
+    for row in rows:
+        builder.append(row)
+        yield row
+    cache.put(digest, sheet_name, builder.build())
 
 
 def to_bool(value: Optional[str]) -> Optional[bool]:
@@ -184,32 +191,22 @@ def to_bool(value: Optional[str]) -> Optional[bool]:
     return None
 
 
-def to_float(value: Optional[str]) -> Optional[float]:
-    if value is None:
-        return None
-    if value == ERROR_VALUE:
-        return None
-    try:
-        return float(value)
-    except Exception:
-        return None
-
-
 def read_match_file(path: str) -> Dict[str, Dict[str, str]]:
+    """duo_school_id -> row of a match CSV (quoted fields may contain commas)."""
     matches: Dict[str, Dict[str, str]] = {}
-    with open(path, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f.readlines() if line.strip()]
-    if not lines:
-        return matches
-    header = [h.strip() for h in lines[0].split(",")]
-    if "duo_school_id" not in header:
-        die("Match file must include duo_school_id column.")
-    for line in lines[1:]:
-        parts = [p.strip() for p in line.split(",")]
-        row = {header[i]: parts[i] if i < len(parts) else "" for i in range(len(header))}
-        duo_id = row.get("duo_school_id") or ""
-        if duo_id:
-            matches[duo_id] = row
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        header = [(h or "").strip() for h in reader.fieldnames or []]
+        if not header:
+            return matches
+        if "duo_school_id" not in header:
+            die("Match file must include duo_school_id column.")
+        reader.fieldnames = header
+        for record in reader:
+            row = {h: (record.get(h) or "").strip() for h in header}
+            duo_id = row["duo_school_id"]
+            if duo_id:
+                matches[duo_id] = row
     return matches
 
 
@@ -224,8 +221,9 @@ def write_unmatched(path: str, rows: List[Dict[str, str]]) -> None:
         "huisnr",
         "huisnr_suffix",
     ]
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(",".join(header) + "\n")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(header)
         for r in rows:
             values = [
                 r.get("duo_school_id", ""),
@@ -235,42 +233,267 @@ def write_unmatched(path: str, rows: List[Dict[str, str]]) -> None:
                 r.get("house_nr", ""),
                 r.get("house_nr_suffix", ""),
             ]
-            safe = [v if isinstance(v, str) else "" for v in values]
-            f.write(",".join(safe) + "\n")
-
-
-def http_request(method: str, url: str, headers: Dict[str, str], body: Optional[bytes] = None) -> Any:
-    req = urllib.request.Request(url, method=method, headers=headers, data=body)
-    try:
-        with urllib.request.urlopen(req) as resp:
-            data = resp.read()
-            if not data:
-                return None
-            return json.loads(data.decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        details = e.read().decode("utf-8")
-        raise RuntimeError(f"HTTP {e.code} {e.reason} - {details}")
+            writer.writerow([v if isinstance(v, str) else "" for v in values])
 
 
-def main() -> None:
-    if len(sys.argv) < 2:
-        die("Usage: python3 scripts/import_duo_school_data.py /path/to/amsterdam_vo_schools_seed.xlsx")
+def write_match_review(path: str, rows: List[Tuple[Dict[str, Any], MatchResult, bool]]) -> None:
+    """One line per (DUO row, match result, reused from crosswalk) that an operator should check."""
+    if not rows:
+        return
+    header = [
+        "duo_school_id",
+        "vestigingsnaam",
+        "postcode",
+        "straat",
+        "huisnr",
+        "huisnr_suffix",
+        "method",
+        "score",
+        "school_id",
+        "school_name",
+        "school_address",
+        "school_postcode",
+        "from_crosswalk",
+    ]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(header)
+        for d, result, reused in rows:
+            target = result.target or {}
+            values = [
+                d.get("duo_school_id", ""),
+                d.get("name", ""),
+                d.get("postcode", ""),
+                d.get("street", ""),
+                d.get("house_nr", ""),
+                d.get("house_nr_suffix", ""),
+                result.method or "",
+                "" if result.score is None else f"{result.score:.3f}",
+                target.get("id", ""),
+                target.get("name", ""),
+                target.get("address", ""),
+                target.get("postcode", ""),
+                "1" if reused else "0",
+            ]
+            writer.writerow([v if isinstance(v, str) else "" for v in values])
+
+
+def chunked(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def fetch_chunk_diff(
+    client: RestClient,
+    metrics: MetricsTable,
+    by_school: Dict[str, List[int]],
+    chunk: Sequence[str],
+    duo_to_school_id: Dict[str, str],
+    workers: int,
+) -> MetricsDiff:
+    """Fetch existing school_metrics for one chunk of schools and diff them against the seed."""
+    params = {
+        "select": "id," + ",".join(METRIC_KEY_FIELDS + CONTENT_FIELDS),
+        "school_id": f"in.({','.join(chunk)})",
+        "order": "id.asc",
+    }
+    existing = [row for page in fetch_pages(client, "school_metrics", params, workers=workers) for row in page]
+    wanted = [i for school_id in chunk for i in by_school[school_id]]
+    return diff_metrics(metrics, wanted, duo_to_school_id, existing)
+
+
+def fetch_metrics_diff(
+    client: RestClient,
+    metrics: MetricsTable,
+    rows: Sequence[int],
+    duo_to_school_id: Dict[str, str],
+    chunk_size: int,
+    workers: int,
+) -> MetricsDiff:
+    """Fetch existing school_metrics per chunk of schools and diff them against the seed."""
+    by_school = metrics.rows_by_school(rows, duo_to_school_id)
+    diff = MetricsDiff()
+    for chunk in chunked(sorted(by_school), chunk_size):
+        diff.extend(fetch_chunk_diff(client, metrics, by_school, chunk, duo_to_school_id, workers))
+    return diff
+
+
+def merge_school_updates(updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """One {"id": ..., **fields} row per school, later payloads winning."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for school_id, payload in updates:
+        merged.setdefault(school_id, {}).update(payload)
+    return [{"id": school_id, **payload} for school_id, payload in merged.items()]
+
+
+def apply_school_updates(
+    client: RestClient,
+    rows: List[Dict[str, Any]],
+    batch_size: int,
+    journal: Optional[ImportJournal] = None,
+) -> None:
+    """Write merged school updates via the duo_bulk_update_schools RPC, batch_size rows per call.
+
+    Falls back to one PATCH per school when the RPC migration is not applied yet.
+    Batches already in `journal` are skipped.
+    """
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i : i + batch_size]
+        key = idempotency_key("schools", batch)
+        if journal and journal.done(key):
+            continue
+        try:
+            client.request(
+                "POST",
+                "rpc/duo_bulk_update_schools",
+                body=json.dumps({"p_updates": batch}, separators=JSON_SEPARATORS).encode("utf-8"),
+                # Sets fields by school id: resending a batch changes nothing.
+                idempotent=True,
+            )
+        except HttpError as e:
+            if e.status != 404:
+                raise
+            print("duo_bulk_update_schools RPC not found; falling back to per-school PATCH.")
+            for row in rows[i:]:
+                key = idempotency_key("school", row)
+                if journal and journal.done(key):
+                    continue
+                school_id = row.pop("id")
+                params = urllib.parse.urlencode({"id": f"eq.{school_id}"})
+                client.request(
+                    "PATCH",
+                    f"schools?{params}",
+                    {"Prefer": "return=minimal"},
+                    body=json.dumps(row, separators=JSON_SEPARATORS).encode("utf-8"),
+                )
+                if journal:
+                    journal.record("school", [key])
+            return
+        if journal:
+            journal.record("schools", [key])
+
+
+def delete_chunks(
+    client: RestClient, column: str, ids: Sequence[str], size: int, journal: Optional[ImportJournal]
+) -> None:
+    """DELETE school_metrics where `column` is in each chunk of ids, skipping journaled chunks."""
+    for chunk in chunked(ids, size):
+        key = idempotency_key(f"delete-{column}", chunk)
+        if journal and journal.done(key):
+            continue
+        client.request("DELETE", f"school_metrics?{column}=in.({','.join(chunk)})")
+        if journal:
+            journal.record("delete", [key])
 
-    xlsx_path = sys.argv[1]
-    if not os.path.exists(xlsx_path):
-        die(f"File not found: {xlsx_path}")
 
-    supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-    if not supabase_url or not service_key:
-        die("Missing NEXT_PUBLIC_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
+def load_fact_hashes(client: RestClient, workers: int) -> Optional[Dict[str, str]]:
+    """Stored school_facts content hashes by school id; None when the table does not exist yet."""
+    params = {"select": "school_id,content_hash", "order": "school_id.asc"}
+    try:
+        return {
+            row["school_id"]: row["content_hash"]
+            for page in fetch_pages(client, "school_facts", params, workers=workers)
+            for row in page
+        }
+    except HttpError as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+def plan_school_facts(
+    client: RestClient,
+    metrics: MetricsTable,
+    rows: Sequence[int],
+    duo_to_school_id: Dict[str, str],
+    workers: int,
+) -> List[Dict[str, Any]]:
+    """school_facts rows for the matched schools whose summary changed."""
+    facts = build_facts(metrics, rows, duo_to_school_id)
+    existing = load_fact_hashes(client, workers)
+    if existing is None:
+        print("school_facts table not found (migration 20260206090000); skipping school facts")
+        return []
+    changed = changed_facts(facts, existing)
+    print(f"School facts: {len(changed)} changed, {len(facts) - len(changed)} unchanged")
+    return changed
+
+
+def upsert_school_facts(client: RestClient, rows: Sequence[Dict[str, Any]], batch_size: int) -> None:
+    updated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    for batch in chunked(rows, batch_size):
+        body = json.dumps([{**row, "updated_at": updated_at} for row in batch], separators=JSON_SEPARATORS)
+        client.request(
+            "POST",
+            "school_facts?on_conflict=school_id",
+            {"Prefer": "resolution=merge-duplicates,return=minimal"},
+            body.encode("utf-8"),
+        )
 
-    dry_run = os.getenv("DUO_IMPORT_DRY_RUN") == "1"
-    allow_name_only = os.getenv("DUO_MATCH_NAME_ONLY") == "1"
-    match_file_path = os.getenv("DUO_MATCH_FILE")
-    unmatched_output = os.getenv("DUO_UNMATCHED_OUTPUT") or "scripts/duo_unmatched.csv"
 
-    headers, rows = load_sheet(xlsx_path, "Schools_AMS_main")
+def write_journaled(
+    writer: AdaptiveBatchWriter,
+    step: str,
+    rows: Iterator[Union[Dict[str, Any], bytes]],
+    journal: Optional[ImportJournal],
+) -> Tuple[WriteStats, int]:
+    """Write rows, keyed per row so a resume skips rows from acknowledged batches.
+
+    Returns (stats, rows skipped as already written). Keys include an
+    occurrence number so identical rows are counted separately.
+    """
+    if journal is None:
+        return writer.write(rows), 0
+    keys: List[str] = []
+    seen: Dict[str, int] = {}
+    skipped = 0
+
+    def pending() -> Iterator[Union[Dict[str, Any], bytes]]:
+        nonlocal skipped
+        for row in rows:
+            key = idempotency_key(step, row)
+            seen[key] = seen.get(key, 0) + 1
+            key = f"{key}#{seen[key]}"
+            if journal.done(key):
+                skipped += 1
+                continue
+            keys.append(key)
+            yield row
+
+    stats = writer.write(pending(), lambda start, count: journal.record(step, keys[start : start + count]))
+    return stats, skipped
+
+
+def read_seed(
+    seed_paths: Sequence[str], parse_workers: int, parse_cache: Optional[ParseCache]
+) -> Tuple[List[Dict[str, Any]], MetricsTable]:
+    """Included DUO vestigingen (as match inputs) and the public Metrics_long rows.
+
+    With several workbooks, later ones win: a DUO vestiging keeps its last
+    row, and a (DUO id, group, name, period) metric keeps the rows of the last
+    workbook that has it. Raises SeedError for a missing sheet or column.
+    """
+    duo_rows: List[Dict[str, Any]] = []
+    metrics = MetricsTable()
+    starts: List[int] = []
+    with ExitStack() as stack:
+        seeds = load_seed_sheets(seed_paths, ["Schools_AMS_main", "Metrics_long"], parse_workers, stack, parse_cache)
+        for seed_path, sheets in zip(seed_paths, seeds):
+            starts.append(len(metrics))
+            duo_rows.extend(read_workbook(seed_path, sheets, metrics))
+    if len(seed_paths) > 1:
+        duo_rows = list({d["duo_school_id"]: d for d in duo_rows}.values())
+        dropped = metrics.merge_sources(starts)
+        print(f"Workbooks: {len(seed_paths)}, metric rows superseded by later workbooks: {dropped}")
+    metrics.decode_values()
+    return duo_rows, metrics
+
+
+def read_workbook(
+    seed_path: str, sheets: Dict[str, Tuple[List[str], Iterator[Row]]], metrics: MetricsTable
+) -> List[Dict[str, Any]]:
+    """One workbook's included DUO rows; its public metrics are appended to `metrics`."""
+    headers, rows = sheets["Schools_AMS_main"]
     idx = {h: i for i, h in enumerate(headers)}
 
     required = [
@@ -289,7 +512,7 @@ def main() -> None:
     ]
     for col in required:
         if col not in idx:
-            die(f"Missing column in Schools_AMS_main: {col}")
+            raise SeedError(f"Missing column in Schools_AMS_main: {col} ({seed_path})")
 
     duo_rows = []
     for r in rows:
@@ -321,29 +544,408 @@ def main() -> None:
             }
         )
 
-    metrics_headers, metrics_rows = load_sheet(xlsx_path, "Metrics_long")
+    metrics_headers, metrics_rows = sheets["Metrics_long"]
     midx = {h: i for i, h in enumerate(metrics_headers)}
-    required_metrics = [
-        "school_id",
-        "metric_period",
-        "metric_group",
-        "metric_name",
-        "value",
-        "unit",
-        "notes",
-        "public_use_ok",
-        "source",
-    ]
-    for col in required_metrics:
+    for col in REQUIRED_METRIC_COLUMNS:
         if col not in midx:
-            die(f"Missing column in Metrics_long: {col}")
+            raise SeedError(f"Missing column in Metrics_long: {col} ({seed_path})")
 
-    metrics_rows_filtered = []
-    for r in metrics_rows:
-        public_ok = r[midx["public_use_ok"]] or ""
-        if "YES" not in public_ok:
+    metrics.extend(midx, metrics_rows)
+    return duo_rows
+
+
+def load_snapshot(client: RestClient, matcher: SchoolMatcher, workers: int) -> None:
+    select_params = {
+        "select": "id,name,address,website_url,duo_school_id,postcode,street,house_nr,house_nr_suffix,lat,lng",
+        "order": "id.asc",
+    }
+    # Index each page as it arrives; later pages are still in flight.
+    for page in fetch_pages(client, "schools", select_params, workers=workers):
+        matcher.add_all(page)
+
+
+def execute_plan(
+    client: RestClient,
+    plan: ImportPlan,
+    journal: Optional[ImportJournal],
+    update_batch_size: int,
+    sync_chunk_size: int,
+    write_concurrency: int,
+    run_stats: RunStats,
+) -> None:
+    """Apply a plan's writes in order: school updates, metric deletes, inserts, updates."""
+    with run_stats.phase("update"):
+        apply_school_updates(client, plan.school_updates, update_batch_size, journal)
+    print(f"Schools updated: {len(plan.school_updates)}")
+    run_stats.count("schools_updated", len(plan.school_updates))
+
+    delete_size = sync_chunk_size if plan.delete_by == "school_id" else DELETE_CHUNK_SIZE
+    with run_stats.phase("delete"):
+        delete_chunks(client, plan.delete_by, plan.deletes, delete_size, journal)
+    run_stats.count(f"metric_deletes_by_{plan.delete_by}", len(plan.deletes))
+    if plan.deletes:
+        print(f"Metrics deletes sent: {len(plan.deletes)} by {plan.delete_by}")
+
+    writer = AdaptiveBatchWriter(
+        client,
+        "school_metrics",
+        {"Prefer": "return=minimal"},
+        max_in_flight=write_concurrency,
+        columns=PAYLOAD_FIELDS,
+    )
+    with run_stats.phase("insert"):
+        stats, skipped = write_journaled(writer, "metrics", iter(plan.inserts), journal)
+    run_stats.count("metrics_inserted", stats.rows)
+    print(
+        f"Metrics rows inserted: {stats.rows} in {stats.requests} requests "
+        f"({stats.rows_per_second:.0f} rows/s, throttled {stats.throttled}x)"
+    )
+    if skipped:
+        print(f"Metrics rows already written before resume: {skipped}")
+    upserter = AdaptiveBatchWriter(
+        client,
+        "school_metrics?on_conflict=id",
+        {"Prefer": "resolution=merge-duplicates,return=minimal"},
+        max_in_flight=write_concurrency,
+        columns=["id"] + PAYLOAD_FIELDS,
+    )
+    with run_stats.phase("upsert"):
+        stats, _ = write_journaled(upserter, "metrics-update", iter(plan.updates), journal)
+    run_stats.count("metrics_updated", stats.rows)
+    if stats.rows:
+        print(f"Metrics rows updated: {stats.rows} in {stats.requests} requests")
+
+    facts = list(plan.facts)
+    if facts:
+        with run_stats.phase("facts"):
+            upsert_school_facts(client, facts, update_batch_size)
+        print(f"School facts upserted: {len(facts)}")
+    run_stats.count("facts_upserted", len(facts))
+
+
+def open_journal(path: Optional[str], run_key: str, resume: bool) -> Optional[ImportJournal]:
+    if not path:
+        return None
+    if resume and not os.path.exists(path):
+        print(f"No journal at {path}; running from the start.")
+    try:
+        journal = ImportJournal(path, run_key, resume=resume)
+    except JournalMismatch as e:
+        die(f"Cannot resume: {e}")
+    if resume and journal.completed:
+        print(f"Resuming: {len(journal.completed)} completed writes in journal")
+    return journal
+
+
+class RowQueue:
+    """Bounded hand-off of row lists from the pipeline producer to a writer thread."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._queue: "queue.Queue[Optional[List[bytes]]]" = queue.Queue(maxsize=max(1, maxsize))
+        self._stopped = threading.Event()
+
+    def put(self, rows: Optional[List[bytes]]) -> None:
+        """Block while the queue is full; raise if the consumer has stopped."""
+        while True:
+            if self._stopped.is_set():
+                if rows is None:
+                    return
+                raise RuntimeError("metrics writer stopped")
+            try:
+                self._queue.put(rows, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def rows(self) -> Iterator[bytes]:
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    return
+                yield from batch
+        finally:
+            self._stopped.set()
+
+
+async def load_inputs(
+    client: RestClient,
+    matcher: SchoolMatcher,
+    seed_paths: Sequence[str],
+    parse_workers: int,
+    parse_cache: Optional[ParseCache],
+    fetch_workers: int,
+    run_stats: RunStats,
+) -> Tuple[List[Dict[str, Any]], MetricsTable]:
+    """Parse the seed while the schools snapshot is being fetched.
+
+    Both threads are awaited before an error from either is raised, so a failed
+    parse does not leave the fetch unobserved (or the other way around).
+    """
+    results = await asyncio.gather(
+        asyncio.to_thread(run_stats.timed, "parse", read_seed, seed_paths, parse_workers, parse_cache),
+        asyncio.to_thread(run_stats.timed, "fetch", load_snapshot, client, matcher, fetch_workers),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    seed, _ = results
+    return seed
+
+
+async def stream_writes(
+    client: RestClient,
+    metrics: MetricsTable,
+    rows: Sequence[int],
+    duo_to_school_id: Dict[str, str],
+    school_updates: List[Dict[str, Any]],
+    journal: Optional[ImportJournal],
+    metrics_sync: str,
+    update_batch_size: int,
+    sync_chunk_size: int,
+    write_concurrency: int,
+    fetch_workers: int,
+    queue_size: int,
+    run_stats: RunStats,
+) -> None:
+    """Write school updates and metrics concurrently, one chunk of schools at a time.
+
+    School updates run alongside the metrics stages. For each chunk of schools
+    the producer deletes (full sync) or fetches and diffs (diff sync), then
+    hands the chunk's rows to the insert/update writers through bounded
+    queues, so early schools are written while later ones are still diffed.
+    """
+    inserts = RowQueue(queue_size)
+    updates = RowQueue(queue_size)
+    writer = AdaptiveBatchWriter(
+        client,
+        "school_metrics",
+        {"Prefer": "return=minimal"},
+        max_in_flight=write_concurrency,
+        columns=PAYLOAD_FIELDS,
+    )
+    upserter = AdaptiveBatchWriter(
+        client,
+        "school_metrics?on_conflict=id",
+        {"Prefer": "resolution=merge-duplicates,return=minimal"},
+        max_in_flight=write_concurrency,
+        columns=["id"] + PAYLOAD_FIELDS,
+    )
+    totals = MetricsDiff()
+
+    async def produce() -> None:
+        try:
+            by_school = metrics.rows_by_school(rows, duo_to_school_id)
+            for chunk in chunked(sorted(by_school), sync_chunk_size):
+                if metrics_sync == "full":
+                    await asyncio.to_thread(
+                        run_stats.timed, "delete", delete_chunks, client, "school_id", chunk, len(chunk), journal
+                    )
+                    run_stats.count("metric_deletes_by_school_id", len(chunk))
+                    diff = MetricsDiff()
+                    diff.inserts.extend(i for school_id in chunk for i in by_school[school_id])
+                else:
+                    diff = await asyncio.to_thread(
+                        run_stats.timed,
+                        "fetch",
+                        fetch_chunk_diff,
+                        client,
+                        metrics,
+                        by_school,
+                        chunk,
+                        duo_to_school_id,
+                        fetch_workers,
+                    )
+                    await asyncio.to_thread(
+                        run_stats.timed, "delete", delete_chunks, client, "id", diff.deletes, DELETE_CHUNK_SIZE, journal
+                    )
+                    run_stats.count("metric_deletes_by_id", len(diff.deletes))
+                totals.extend(diff)
+                if diff.inserts:
+                    payloads = [metrics.row_json(i, duo_to_school_id) for i in diff.inserts]
+                    await asyncio.to_thread(inserts.put, payloads)
+                if diff.updates:
+                    payloads = [metrics.row_json(i, duo_to_school_id, metric_id) for i, metric_id in diff.updates]
+                    await asyncio.to_thread(updates.put, payloads)
+        finally:
+            await asyncio.to_thread(inserts.put, None)
+            await asyncio.to_thread(updates.put, None)
+
+    _, (insert_stats, skipped), (update_stats, _), _ = await asyncio.gather(
+        asyncio.to_thread(
+            run_stats.timed, "update", apply_school_updates, client, school_updates, update_batch_size, journal
+        ),
+        asyncio.to_thread(run_stats.timed, "insert", write_journaled, writer, "metrics", inserts.rows(), journal),
+        asyncio.to_thread(
+            run_stats.timed, "upsert", write_journaled, upserter, "metrics-update", updates.rows(), journal
+        ),
+        produce(),
+    )
+    run_stats.count("schools_updated", len(school_updates))
+    run_stats.count("metrics_inserted", insert_stats.rows)
+    run_stats.count("metrics_updated", update_stats.rows)
+    print(f"Schools updated: {len(school_updates)}")
+    if metrics_sync == "diff":
+        print(
+            f"Metrics diff: {len(totals.inserts)} insert, {len(totals.updates)} update, "
+            f"{len(totals.deletes)} delete, {totals.unchanged} unchanged"
+        )
+    print(
+        f"Metrics rows inserted: {insert_stats.rows} in {insert_stats.requests} requests "
+        f"({insert_stats.rows_per_second:.0f} rows/s, throttled {insert_stats.throttled}x)"
+    )
+    if skipped:
+        print(f"Metrics rows already written before resume: {skipped}")
+    if update_stats.rows:
+        print(f"Metrics rows updated: {update_stats.rows} in {update_stats.requests} requests")
+
+
+def finish_run(
+    client: RestClient,
+    run_stats: RunStats,
+    command: str,
+    status: str,
+    error: Optional[str],
+    school_year_label: Optional[str],
+    output_path: Optional[str],
+) -> None:
+    """Print the run stats as JSON and record the run in data_sync_runs.
+
+    `school_year_label` None skips the data_sync_runs row (plan, dry run,
+    DUO_RECORD_RUN=0). A failed insert only warns; the import itself is done.
+    """
+    summary = {"command": command, "status": status, **run_stats.summary()}
+    if error:
+        summary["error"] = error
+    print(f"Run stats: {json.dumps(summary)}")
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if school_year_label is None:
+        return
+    notes = error or ", ".join(f"{name.replace('_', ' ')}: {value}" for name, value in run_stats.counts.items())
+    row = {
+        "source": "duo_school_metrics",
+        "school_year_label": school_year_label or "unknown",
+        "status": status,
+        "notes": notes,
+        "metrics": summary,
+    }
+    try:
+        client.request("POST", "data_sync_runs", {"Prefer": "return=minimal"}, json.dumps(row).encode("utf-8"))
+    except (HttpError, OSError) as e:
+        print(f"Warning: could not write data_sync_runs: {e}")
+
+
+USAGE = """Usage:
+  python3 scripts/import_duo_school_data.py /path/to/seed.xlsx|seed_dir [more seeds | 'seeds/*.xlsx' ...] [--resume]
+  python3 scripts/import_duo_school_data.py plan /path/to/seed.xlsx [...] --out /path/to/plan.jsonl[.gz]
+  python3 scripts/import_duo_school_data.py apply /path/to/plan.jsonl[.gz] [--resume]"""
+
+
+def expand_inputs(patterns: Sequence[str]) -> List[str]:
+    """Seed paths (workbooks or sheet directories) in argument order; globs expand to their sorted matches."""
+    paths: List[str] = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                die(f"No files match: {pattern}")
+            paths.extend(matches)
+        elif os.path.exists(pattern):
+            paths.append(pattern)
+        else:
+            die(f"File not found: {pattern}")
+    return list(dict.fromkeys(paths))
+
+
+def check_plan_output(path: str, seed_paths: Sequence[str]) -> None:
+    """Refuse plan outputs that would overwrite a seed (e.g. an unquoted glob swallowing --out)."""
+    if os.path.isdir(path):
+        die(f"Plan output is a directory: {path}")
+    if path.lower().endswith(".xlsx"):
+        die(f"Plan output must not be an .xlsx file: {path}")
+    target = os.path.realpath(path)
+    if any(os.path.realpath(seed) == target for seed in seed_paths):
+        die(f"Plan output is one of the seeds: {path}")
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    args: List[str] = []
+    flags: List[str] = []
+    plan_output: Optional[str] = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg in ("-o", "--out"):
+            if i + 1 >= len(argv):
+                die(USAGE)
+            plan_output = argv[i + 1]
+            i += 2
             continue
-        metrics_rows_filtered.append(r)
+        if arg.startswith("--out="):
+            plan_output = arg.split("=", 1)[1]
+        elif arg.startswith("-"):
+            flags.append(arg)
+        else:
+            args.append(arg)
+        i += 1
+    command = args.pop(0) if args and args[0] in ("plan", "apply") else "run"
+    if command == "apply":
+        valid = len(args) == 1
+    else:
+        valid = len(args) >= 1
+    # The plan file only comes from --out, so it can never be mistaken for a seed.
+    valid = valid and (plan_output is not None) == (command == "plan") and plan_output != ""
+    if not valid or any(f != "--resume" for f in flags) or (flags and command == "plan"):
+        die(USAGE)
+
+    resume = "--resume" in flags
+    if command == "apply" and not os.path.exists(args[0]):
+        die(f"File not found: {args[0]}")
+
+    supabase_url = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not supabase_url or not service_key:
+        die("Missing NEXT_PUBLIC_SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY")
+
+    dry_run = os.getenv("DUO_IMPORT_DRY_RUN") == "1"
+    allow_name_only = os.getenv("DUO_MATCH_NAME_ONLY") == "1"
+    fuzzy_threshold = None
+    if os.getenv("DUO_MATCH_FUZZY") == "1":
+        fuzzy_threshold = float(os.getenv("DUO_MATCH_FUZZY_THRESHOLD") or "0.75")
+    centroids_path = os.getenv("DUO_POSTCODE_CENTROIDS")
+    match_radius_m = float(os.getenv("DUO_MATCH_RADIUS_M") or "300")
+    crosswalk_path = None
+    if os.getenv("DUO_CROSSWALK") != "0":
+        crosswalk_path = os.getenv("DUO_CROSSWALK_PATH") or "scripts/.duo_crosswalk.sqlite"
+    match_file_path = os.getenv("DUO_MATCH_FILE")
+    unmatched_output = os.getenv("DUO_UNMATCHED_OUTPUT") or "scripts/duo_unmatched.csv"
+    review_output = os.getenv("DUO_REVIEW_OUTPUT") or "scripts/duo_match_review.csv"
+    parse_workers = int(os.getenv("DUO_PARSE_WORKERS") or "0")
+    fetch_workers = int(os.getenv("DUO_FETCH_WORKERS") or "4")
+    update_batch_size = int(os.getenv("DUO_UPDATE_BATCH_SIZE") or "500")
+    write_concurrency = int(os.getenv("DUO_WRITE_CONCURRENCY") or "4")
+    metrics_sync = os.getenv("DUO_METRICS_SYNC") or "diff"
+    sync_chunk_size = int(os.getenv("DUO_SYNC_CHUNK_SIZE") or "100")
+    if metrics_sync not in ("diff", "full"):
+        die("DUO_METRICS_SYNC must be 'diff' or 'full'")
+    pipeline = os.getenv("DUO_PIPELINE") == "1"
+    school_facts = os.getenv("DUO_SCHOOL_FACTS") != "0"
+    pipeline_queue_size = int(os.getenv("DUO_PIPELINE_QUEUE_SIZE") or "4")
+    journal_path = None
+    if os.getenv("DUO_JOURNAL") != "0":
+        journal_path = os.getenv("DUO_JOURNAL_PATH") or "scripts/.duo_import_journal.jsonl"
+    if resume and not journal_path:
+        die("--resume needs the write journal (unset DUO_JOURNAL=0)")
+    parse_cache = None
+    if os.getenv("DUO_PARSE_CACHE") != "0":
+        parse_cache = ParseCache(
+            os.getenv("DUO_PARSE_CACHE_DIR") or "scripts/.duo_parse_cache",
+            int(os.getenv("DUO_PARSE_CACHE_MAX_MB") or "256") * 1024 * 1024,
+        )
 
     headers_common = {
         "apikey": service_key,
@@ -351,198 +953,298 @@ def main() -> None:
         "Content-Type": "application/json",
     }
 
-    schools_url = f"{supabase_url}/rest/v1/schools"
-    select_params = urllib.parse.urlencode(
-        {
-            "select": "id,name,address,website_url,duo_school_id,postcode,street,house_nr,house_nr_suffix",
-            "limit": "1000",
-        }
+    run_stats = RunStats(os.getenv("DUO_PROFILE_OUTPUT"), trace_memory=os.getenv("DUO_TRACE_MEMORY") == "1")
+    run_stats_output = os.getenv("DUO_RUN_STATS_OUTPUT")
+    record_run = os.getenv("DUO_RECORD_RUN") != "0" and command != "plan" and not dry_run
+    school_year_label = os.getenv("DUO_SCHOOL_YEAR_LABEL") or ""
+
+    client = RestClient(
+        f"{supabase_url}/rest/v1",
+        headers_common,
+        pool_size=int(os.getenv("SUPABASE_HTTP_POOL_SIZE") or "4"),
+        max_retries=int(os.getenv("SUPABASE_HTTP_RETRIES") or "4"),
+        observer=run_stats.http.observe,
+        gzip_requests=os.getenv("SUPABASE_GZIP_REQUESTS") == "1",
     )
-    existing = http_request("GET", f"{schools_url}?{select_params}", headers_common) or []
-
-    existing_by_duo = {}
-    existing_by_name_postcode = defaultdict(list)
-    existing_by_postcode_house = defaultdict(list)
-    existing_by_name = defaultdict(list)
-
-    for s in existing:
-        name_key = norm_text(s.get("name"))
-        postcode_key = norm_postcode(s.get("postcode"))
-        address_postcode, address_house = parse_address_components(s.get("address"))
-        address_house_norm = address_house or ""
-        if s.get("duo_school_id"):
-            existing_by_duo[s["duo_school_id"]] = s
-        if name_key and postcode_key:
-            existing_by_name_postcode[(name_key, postcode_key)].append(s)
-        if name_key:
-            existing_by_name[name_key].append(s)
-        if address_postcode and address_house_norm:
-            existing_by_postcode_house[(address_postcode, address_house_norm)].append(s)
-
-    manual_matches = read_match_file(match_file_path) if match_file_path else {}
-
-    matched = 0
-    name_only_matches = 0
-    manual_match_count = 0
-    ambiguous = 0
-    unmatched = 0
-
-    updates = []
-    duo_to_school_id = {}
-    unmatched_rows: List[Dict[str, str]] = []
-
-    for d in duo_rows:
-        duo_id = d["duo_school_id"]
-        name_key = norm_text(d["name"])
-        postcode_key = d["postcode"]
-
-        manual = manual_matches.get(duo_id)
-        if manual:
-            school_id_override = manual.get("school_id") or ""
-            if school_id_override:
-                target = next((s for s in existing if s.get("id") == school_id_override), None)
+
+    status = "success"
+    error = None
+    run_stats.start()
+    try:
+        if command == "apply":
+            plan_path = args[0]
+            journal = None if dry_run else open_journal(journal_path, f"plan:{file_digest(plan_path)}", resume)
+            try:
+                with open_plan(plan_path, "r") as f:
+                    plan = PlanReader(f).plan()
+                    print(f"Plan {plan_path} ({plan.source}): {json.dumps(plan.counts())}")
+                    if dry_run:
+                        print("Dry run enabled. Skipping writes.")
+                        return
+                    execute_plan(
+                        client, plan, journal, update_batch_size, sync_chunk_size, write_concurrency, run_stats
+                    )
+            except PlanError as e:
+                die(f"Invalid plan: {e}")
+            if journal:
+                journal.finish()
+            return
+
+        seed_paths = expand_inputs(args)
+        if plan_output is not None:
+            check_plan_output(plan_output, seed_paths)
+        centroids = {}
+        if centroids_path:
+            if not os.path.exists(centroids_path):
+                die(f"Postcode centroids file not found: {centroids_path}")
+            centroids = read_postcode_centroids(centroids_path)
+            print(f"Postcode centroids: {len(centroids)}")
+
+        matcher = SchoolMatcher(
+            allow_name_only=allow_name_only,
+            fuzzy_threshold=fuzzy_threshold,
+            centroids=centroids,
+            radius_m=match_radius_m,
+        )
+        try:
+            if pipeline:
+                duo_rows, metrics = asyncio.run(
+                    load_inputs(client, matcher, seed_paths, parse_workers, parse_cache, fetch_workers, run_stats)
+                )
             else:
-                target = None
-                manual_name = norm_text(manual.get("school_name") or "")
-                if manual_name:
-                    candidates = existing_by_name.get(manual_name, [])
-                    if len(candidates) == 1:
-                        target = candidates[0]
-            if target:
-                manual_match_count += 1
-        else:
-            target = existing_by_duo.get(duo_id)
-        if not target and postcode_key and d.get("house_nr"):
-            duo_house = d.get("house_nr") or ""
-            duo_suffix = d.get("house_nr_suffix") or ""
-            duo_house_norm = f"{duo_house}{duo_suffix}".strip()
-            candidates = existing_by_postcode_house.get((postcode_key, duo_house_norm), [])
-            if len(candidates) == 1:
-                target = candidates[0]
-            elif len(candidates) > 1:
+                with run_stats.phase("parse"):
+                    duo_rows, metrics = read_seed(seed_paths, parse_workers, parse_cache)
+                with run_stats.phase("fetch"):
+                    load_snapshot(client, matcher, fetch_workers)
+        except SeedError as e:
+            die(str(e))
+        if not school_year_label:
+            school_year_label = ",".join(metrics.periods())
+
+        manual_matches = read_match_file(match_file_path) if match_file_path else {}
+        match_wall = time.perf_counter()
+        match_cpu = time.process_time()
+
+        matched = 0
+        name_only_matches = 0
+        manual_match_count = 0
+        fuzzy_matches = 0
+        spatial_matches = 0
+        ambiguous = 0
+        unmatched = 0
+
+        school_updates = []
+        duo_to_school_id = {}
+        unmatched_rows: List[Dict[str, str]] = []
+        review_rows: List[Tuple[Dict[str, Any], MatchResult, bool]] = []
+
+        crosswalk = Crosswalk(crosswalk_path) if crosswalk_path else None
+        reused = 0
+        decided: Dict[str, Decision] = {}
+        dropped: List[str] = []
+
+        for d in duo_rows:
+            duo_id = d["duo_school_id"]
+            manual = manual_matches.get(duo_id)
+            result = None
+            reused_decision = False
+            fingerprint = ""
+            if crosswalk:
+                fingerprint = matcher.fingerprint(d, manual)
+                decision = crosswalk.lookup(duo_id, fingerprint)
+                if decision and decision.school_id in matcher.by_id:
+                    result = MatchResult(matcher.by_id[decision.school_id], decision.method)
+                    reused_decision = True
+                    reused += 1
+            if result is None:
+                result = matcher.match(d, manual)
+                if crosswalk:
+                    if result.target:
+                        decided[duo_id] = Decision(result.target["id"], result.method or "", fingerprint)
+                    elif duo_id in crosswalk.decisions():
+                        dropped.append(duo_id)
+            if result.ambiguous:
                 ambiguous += 1
                 continue
-        if not target and name_key and postcode_key:
-            candidates = existing_by_name_postcode.get((name_key, postcode_key), [])
-            if len(candidates) == 1:
-                target = candidates[0]
-            elif len(candidates) > 1:
-                ambiguous += 1
+            target = result.target
+            if not target:
+                unmatched += 1
+                unmatched_rows.append(d)
                 continue
-        if not target and allow_name_only and name_key:
-            candidates = existing_by_name.get(name_key, [])
-            if len(candidates) == 1:
-                target = candidates[0]
+            if result.method == MANUAL:
+                manual_match_count += 1
+            elif result.method == NAME_ONLY:
                 name_only_matches += 1
-            elif len(candidates) > 1:
-                ambiguous += 1
-                continue
-
-        if not target:
-            unmatched += 1
-            unmatched_rows.append(d)
-            continue
-
-        matched += 1
-        duo_to_school_id[duo_id] = target["id"]
-
-        payload: Dict[str, Any] = {}
-        if not target.get("duo_school_id"):
-            payload["duo_school_id"] = duo_id
-        if not target.get("postcode") and d.get("postcode"):
-            payload["postcode"] = d["postcode"]
-        if not target.get("street") and d.get("street"):
-            payload["street"] = d["street"]
-        if not target.get("house_nr") and d.get("house_nr"):
-            payload["house_nr"] = d["house_nr"]
-        if not target.get("house_nr_suffix") and d.get("house_nr_suffix"):
-            payload["house_nr_suffix"] = d["house_nr_suffix"]
-        if d.get("brin"):
-            payload["brin"] = d["brin"]
-        if d.get("vestiging_nr"):
-            payload["vestiging_nr"] = d["vestiging_nr"]
-        if d.get("denominatie"):
-            payload["denominatie"] = d["denominatie"]
-        if d.get("phone"):
-            payload["phone"] = d["phone"]
-        if d.get("website") and not target.get("website_url"):
-            website = d["website"].strip()
-            if website and not website.startswith("http"):
-                website = f"https://{website}"
-            payload["website_url"] = website
-
-        if payload:
-            updates.append((target["id"], payload))
-
-    print(f"Schools in seed: {len(duo_rows)}")
-    print(f"Matched: {matched} (manual: {manual_match_count}, name-only: {name_only_matches})")
-    print(f"Ambiguous: {ambiguous}")
-    print(f"Unmatched: {unmatched}")
-    print(f"Schools to update: {len(updates)}")
-
-    if unmatched_rows:
-        write_unmatched(unmatched_output, unmatched_rows)
-        print(f"Unmatched list written: {unmatched_output}")
-
-    if dry_run:
-        print("Dry run enabled. Skipping writes.")
-        return
-
-    for school_id, payload in updates:
-        params = urllib.parse.urlencode({"id": f"eq.{school_id}"})
-        http_request(
-            "PATCH",
-            f"{schools_url}?{params}",
-            {**headers_common, "Prefer": "return=minimal"},
-            body=json.dumps(payload).encode("utf-8"),
+            elif result.method == FUZZY:
+                fuzzy_matches += 1
+            elif result.method == SPATIAL:
+                spatial_matches += 1
+
+            if result.method in REVIEW_METHODS:
+                review_rows.append((d, result, reused_decision))
+
+            matched += 1
+            duo_to_school_id[duo_id] = target["id"]
+
+            payload: Dict[str, Any] = {}
+            # A stored DUO id turns the pair into an exact match on every later run,
+            # so unconfirmed (review) matches do not get one.
+            if not target.get("duo_school_id") and result.method not in REVIEW_METHODS:
+                payload["duo_school_id"] = duo_id
+            if not target.get("postcode") and d.get("postcode"):
+                payload["postcode"] = d["postcode"]
+            if not target.get("street") and d.get("street"):
+                payload["street"] = d["street"]
+            if not target.get("house_nr") and d.get("house_nr"):
+                payload["house_nr"] = d["house_nr"]
+            if not target.get("house_nr_suffix") and d.get("house_nr_suffix"):
+                payload["house_nr_suffix"] = d["house_nr_suffix"]
+            if d.get("brin"):
+                payload["brin"] = d["brin"]
+            if d.get("vestiging_nr"):
+                payload["vestiging_nr"] = d["vestiging_nr"]
+            if d.get("denominatie"):
+                payload["denominatie"] = d["denominatie"]
+            if d.get("phone"):
+                payload["phone"] = d["phone"]
+            if d.get("website") and not target.get("website_url"):
+                website = d["website"].strip()
+                if website and not website.startswith("http"):
+                    website = f"https://{website}"
+                payload["website_url"] = website
+
+            if payload:
+                school_updates.append((target["id"], payload))
+
+        run_stats.add_phase("match", time.perf_counter() - match_wall, time.process_time() - match_cpu)
+        run_stats.count("seed_schools", len(duo_rows))
+        run_stats.count("metric_rows", len(metrics))
+        run_stats.count("matched", matched)
+        run_stats.count("unmatched", unmatched)
+        run_stats.count("ambiguous", ambiguous)
+        run_stats.detail("normalize_cache", cache_stats())
+        print(f"Schools in seed: {len(duo_rows)}")
+        print(
+            f"Matched: {matched} (manual: {manual_match_count}, name-only: {name_only_matches}, "
+            f"spatial: {spatial_matches}, fuzzy: {fuzzy_matches})"
         )
-
-    # Build metrics for matched schools only
-    metrics_payload = []
-    for r in metrics_rows_filtered:
-        duo_id = r[midx["school_id"]]
-        school_id = duo_to_school_id.get(duo_id)
-        if not school_id:
-            continue
-        value_raw = r[midx["value"]]
-        value_numeric = to_float(value_raw)
-        value_text = None if value_numeric is not None else (value_raw if value_raw != ERROR_VALUE else None)
-        metrics_payload.append(
-            {
-                "school_id": school_id,
-                "duo_school_id": duo_id,
-                "metric_group": r[midx["metric_group"]],
-                "metric_name": r[midx["metric_name"]],
-                "period": r[midx["metric_period"]],
-                "value_numeric": value_numeric,
-                "value_text": value_text,
-                "unit": r[midx["unit"]],
-                "notes": r[midx["notes"]],
-                "source": r[midx["source"]],
-                "public_use_ok": r[midx["public_use_ok"]],
-            }
+        print(f"Ambiguous: {ambiguous}")
+        print(f"Unmatched: {unmatched}")
+        if crosswalk:
+            print(f"Crosswalk: reused {reused}, re-matched {len(duo_rows) - reused}")
+            crosswalk.save(decided, dropped)
+            crosswalk.close()
+        merged_updates = merge_school_updates(school_updates)
+        print(f"Schools to update: {len(merged_updates)}")
+
+        if unmatched_rows:
+            write_unmatched(unmatched_output, unmatched_rows)
+            print(f"Unmatched list written: {unmatched_output}")
+        if review_rows:
+            write_match_review(review_output, review_rows)
+            print(f"Name-only/spatial/fuzzy matches to review ({len(review_rows)}): {review_output}")
+
+        if dry_run and command == "run":
+            print("Dry run enabled. Skipping writes.")
+            return
+
+        # Metrics for matched schools only; payload dicts are built per batch when written.
+        matched_metric_rows = metrics.matched_rows(duo_to_school_id)
+        print(f"Metrics rows for matched schools: {len(matched_metric_rows)}")
+
+        if pipeline and command == "run":
+            journal = open_journal(journal_path, f"{','.join(map(seed_digest, seed_paths))}:{metrics_sync}", resume)
+            asyncio.run(
+                stream_writes(
+                    client,
+                    metrics,
+                    matched_metric_rows,
+                    duo_to_school_id,
+                    merged_updates,
+                    journal,
+                    metrics_sync,
+                    update_batch_size,
+                    sync_chunk_size,
+                    write_concurrency,
+                    fetch_workers,
+                    pipeline_queue_size,
+                    run_stats,
+                )
+            )
+            if school_facts:
+                with run_stats.phase("facts"):
+                    facts = plan_school_facts(client, metrics, matched_metric_rows, duo_to_school_id, fetch_workers)
+                    upsert_school_facts(client, facts, update_batch_size)
+                print(f"School facts upserted: {len(facts)}")
+                run_stats.count("facts_upserted", len(facts))
+            if journal:
+                journal.finish()
+            return
+
+        if metrics_sync == "full":
+            # Remove existing metrics for matched schools to avoid duplicates
+            delete_by = "school_id"
+            deletes = metrics.matched_school_ids(duo_to_school_id)
+            inserts = matched_metric_rows
+            metric_updates: List[Tuple[int, str]] = []
+        else:
+            with run_stats.phase("fetch"):
+                diff = fetch_metrics_diff(
+                    client, metrics, matched_metric_rows, duo_to_school_id, sync_chunk_size, fetch_workers
+                )
+            print(
+                f"Metrics diff: {len(diff.inserts)} insert, {len(diff.updates)} update, "
+                f"{len(diff.deletes)} delete, {diff.unchanged} unchanged"
+            )
+            delete_by = "id"
+            deletes = diff.deletes
+            inserts = diff.inserts
+            metric_updates = diff.updates
+
+        facts: List[Dict[str, Any]] = []
+        if school_facts:
+            with run_stats.phase("facts"):
+                facts = plan_school_facts(client, metrics, matched_metric_rows, duo_to_school_id, fetch_workers)
+
+        plan = ImportPlan(
+            source=",".join(os.path.basename(path) for path in seed_paths),
+            delete_by=delete_by,
+            unmatched=unmatched_rows,
+            school_updates=merged_updates,
+            deletes=deletes,
+            inserts=(metrics.row_json(row, duo_to_school_id) for row in inserts),
+            updates=(metrics.row_json(row, duo_to_school_id, metric_id) for row, metric_id in metric_updates),
+            insert_count=len(inserts),
+            update_count=len(metric_updates),
+            facts=facts,
+            fact_count=len(facts),
         )
 
-    print(f"Metrics rows to insert: {len(metrics_payload)}")
-
-    # Remove existing metrics for matched schools to avoid duplicates
-    school_ids = list({m["school_id"] for m in metrics_payload})
-    if school_ids:
-        delete_filter = ",".join(school_ids)
-        delete_url = f"{supabase_url}/rest/v1/school_metrics?school_id=in.({delete_filter})"
-        http_request("DELETE", delete_url, headers_common)
-
-    batch_size = 200
-    metrics_url = f"{supabase_url}/rest/v1/school_metrics"
-    for i in range(0, len(metrics_payload), batch_size):
-        batch = metrics_payload[i : i + batch_size]
-        http_request(
-            "POST",
-            metrics_url,
-            {**headers_common, "Prefer": "return=minimal"},
-            body=json.dumps(batch).encode("utf-8"),
+        if command == "plan":
+            write_plan(plan_output, plan)
+            print(f"Plan written: {plan_output} {json.dumps(plan.counts())}")
+            return
+
+        journal = open_journal(journal_path, f"{','.join(map(seed_digest, seed_paths))}:{metrics_sync}", resume)
+        execute_plan(client, plan, journal, update_batch_size, sync_chunk_size, write_concurrency, run_stats)
+        if journal:
+            journal.finish()
+
+    except BaseException as e:
+        # die() raises SystemExit with its message; record those as failed runs too.
+        status = "failed"
+        error = str(e) or type(e).__name__
+        raise
+    finally:
+        finish_run(
+            client,
+            run_stats,
+            command,
+            status,
+            error,
+            school_year_label if record_run else None,
+            run_stats_output,
         )
-        time.sleep(0.1)
 
 
 if __name__ == "__main__":
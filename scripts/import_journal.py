@@ -0,0 +1,86 @@
+"""Write-ahead journal of completed import writes.
+
+The journal is a JSONL file: a header line naming the run (seed digest plus
+sync mode), then one line per completed write step listing its idempotency
+keys. `--resume` reloads the keys of an unfinished run so those steps are
+skipped; a successful run removes the file.
+
+Steps are recorded after the server acknowledged them, so a crash between the
+response and the journal append replays that one step.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Iterable, Set
+
+
+class JournalMismatch(RuntimeError):
+    pass
+
+
+def idempotency_key(step: str, payload: Any) -> str:
+    """`step:hash`; bytes payloads (pre-encoded rows) are hashed as they are."""
+    if isinstance(payload, bytes):
+        encoded = payload
+    else:
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f"{step}:{hashlib.blake2b(encoded, digest_size=12).hexdigest()}"
+
+
+class ImportJournal:
+    def __init__(self, path: str, run_key: str, resume: bool = False) -> None:
+        self.path = path
+        self.run_key = run_key
+        self.completed: Set[str] = set()
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, "a", encoding="utf-8")
+            self._file.write("\n")
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+            self._append({"run": run_key})
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn line from a crash mid-append; the step is simply replayed.
+                    continue
+                if n == 0:
+                    if entry.get("run") != self.run_key:
+                        raise JournalMismatch(f"{self.path} belongs to a different seed file or sync mode")
+                    continue
+                self.completed.update(entry.get("keys") or [])
+
+    def _append(self, entry: Any) -> None:
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def done(self, key: str) -> bool:
+        return key in self.completed
+
+    def record(self, step: str, keys: Iterable[str]) -> None:
+        """Mark keys as written; safe to call from writer threads."""
+        keys = list(keys)
+        with self._lock:
+            self.completed.update(keys)
+            self._append({"step": step, "keys": keys})
+
+    def finish(self) -> None:
+        """Close and remove the journal after a successful run."""
+        self._file.close()
+        os.remove(self.path)
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,168 @@
+"""Serialized DUO import plan (JSON Lines, gzip when the path ends in .gz).
+
+A plan holds every write an import would make, in the order they are applied:
+
+    {"kind": "header", "version": 1, "source": ..., "delete_by": "id" | "school_id", "counts": {...}}
+    {"kind": "unmatched", "row": {...}}                       one per unmatched DUO row
+    {"kind": "school_update", "row": {"id": ..., ...}}        merged per school
+    {"kind": "metric_delete", "<delete_by>": ...}             one per metric id / school id
+    {"kind": "metric_insert", "row": {...}}
+    {"kind": "metric_update", "row": {"id": ..., ...}}
+    {"kind": "school_fact", "row": {"school_id": ..., ...}}  changed school_facts rows
+
+Sections are contiguous, so a plan can be applied in one streaming pass.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Union
+
+PLAN_VERSION = 1
+
+SECTIONS = ["unmatched", "school_update", "metric_delete", "metric_insert", "metric_update", "school_fact"]
+
+
+class PlanError(ValueError):
+    pass
+
+
+class ImportPlan:
+    """Writes in apply order; `inserts`/`updates` may be lazy iterables of
+    dicts or pre-encoded JSON objects (bytes, copied into the file as-is)."""
+
+    def __init__(
+        self,
+        source: str,
+        delete_by: str,
+        unmatched: List[Dict[str, Any]],
+        school_updates: List[Dict[str, Any]],
+        deletes: List[str],
+        inserts: Iterable[Union[Dict[str, Any], bytes]],
+        updates: Iterable[Union[Dict[str, Any], bytes]],
+        insert_count: int,
+        update_count: int,
+        facts: Iterable[Dict[str, Any]] = (),
+        fact_count: int = 0,
+    ) -> None:
+        self.source = source
+        self.delete_by = delete_by
+        self.unmatched = unmatched
+        self.school_updates = school_updates
+        self.deletes = deletes
+        self.inserts = inserts
+        self.updates = updates
+        self.insert_count = insert_count
+        self.update_count = update_count
+        self.facts = facts
+        self.fact_count = fact_count
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "unmatched": len(self.unmatched),
+            "school_update": len(self.school_updates),
+            "metric_delete": len(self.deletes),
+            "metric_insert": self.insert_count,
+            "metric_update": self.update_count,
+            "school_fact": self.fact_count,
+        }
+
+
+def open_plan(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_plan(path: str, plan: ImportPlan) -> None:
+    def line(entry: Dict[str, Any]) -> str:
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def row_line(kind: str, row: Union[Dict[str, Any], bytes]) -> str:
+        if isinstance(row, bytes):
+            return f'{{"kind":"{kind}","row":{row.decode("utf-8")}}}\n'
+        return line({"kind": kind, "row": row})
+
+    with open_plan(path, "w") as f:
+        f.write(
+            line(
+                {
+                    "kind": "header",
+                    "version": PLAN_VERSION,
+                    "source": plan.source,
+                    "delete_by": plan.delete_by,
+                    "counts": plan.counts(),
+                }
+            )
+        )
+        for row in plan.unmatched:
+            f.write(line({"kind": "unmatched", "row": row}))
+        for row in plan.school_updates:
+            f.write(line({"kind": "school_update", "row": row}))
+        for value in plan.deletes:
+            f.write(line({"kind": "metric_delete", plan.delete_by: value}))
+        for row in plan.inserts:
+            f.write(row_line("metric_insert", row))
+        for row in plan.updates:
+            f.write(row_line("metric_update", row))
+        for row in plan.facts:
+            f.write(line({"kind": "school_fact", "row": row}))
+
+
+class PlanReader:
+    """Reads a plan section by section; sections must be consumed in order."""
+
+    def __init__(self, f: IO[str]) -> None:
+        self._lines = iter(f)
+        self._next: Optional[Dict[str, Any]] = None
+        header = self._read()
+        if header is None or header.get("kind") != "header":
+            raise PlanError("plan file has no header")
+        if header.get("version") != PLAN_VERSION:
+            raise PlanError(f"unsupported plan version: {header.get('version')}")
+        self.header = header
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        for line in self._lines:
+            if line.strip():
+                return json.loads(line)
+        return None
+
+    def _peek(self) -> Optional[Dict[str, Any]]:
+        if self._next is None:
+            self._next = self._read()
+        return self._next
+
+    def section(self, kind: str) -> Iterator[Dict[str, Any]]:
+        while True:
+            entry = self._peek()
+            if entry is not None and entry.get("kind") not in SECTIONS:
+                raise PlanError(f"unknown plan entry: {entry.get('kind')}")
+            if entry is None or entry.get("kind") != kind:
+                if entry is not None and SECTIONS.index(entry.get("kind")) < SECTIONS.index(kind):
+                    raise PlanError(f"plan sections out of order: {entry.get('kind')} after {kind}")
+                return
+            self._next = None
+            yield entry
+
+    def plan(self) -> ImportPlan:
+        """An ImportPlan whose metric inserts/updates and facts stream from the file."""
+        delete_by = self.header.get("delete_by") or "id"
+        counts = self.header.get("counts") or {}
+        unmatched = [e["row"] for e in self.section("unmatched")]
+        school_updates = [e["row"] for e in self.section("school_update")]
+        deletes = [e[delete_by] for e in self.section("metric_delete")]
+        return ImportPlan(
+            source=self.header.get("source") or "",
+            delete_by=delete_by,
+            unmatched=unmatched,
+            school_updates=school_updates,
+            deletes=deletes,
+            inserts=(e["row"] for e in self.section("metric_insert")),
+            updates=(e["row"] for e in self.section("metric_update")),
+            insert_count=counts.get("metric_insert", 0),
+            update_count=counts.get("metric_update", 0),
+            facts=(e["row"] for e in self.section("school_fact")),
+            fact_count=counts.get("school_fact", 0),
+        )
@@ -0,0 +1,149 @@
+"""Content-addressed on-disk cache of decoded seed sheets.
+
+Entries are keyed by the SHA-256 of the seed file plus the sheet name, so an
+edited workbook never hits a stale entry. Each entry stores a SheetData in a
+small binary columnar layout:
+
+    MAGIC | u32 header length | JSON header | value offsets (u64) | UTF-8 values | columns (u32 each)
+
+The cache directory is trimmed to `max_bytes` after every write, evicting the
+least recently used entries first (hits refresh the mtime).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import List, Optional
+
+from xlsx_reader import SheetData
+
+MAGIC = b"DUOSHEET1\n"
+SUFFIX = ".sheet"
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def encode_sheet(data: SheetData) -> bytes:
+    strings = [v or "" for v in data.values[1:]]
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for value in strings:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    header = json.dumps(
+        {
+            "headers": data.headers,
+            "rows": len(data),
+            "values": len(strings),
+            "byteorder": sys.byteorder,
+        }
+    ).encode("utf-8")
+    parts = [MAGIC, struct.pack("<I", len(header)), header, offsets.tobytes(), bytes(blob)]
+    parts.extend(col.tobytes() for col in data.columns)
+    return b"".join(parts)
+
+
+def decode_sheet(buf: bytes) -> SheetData:
+    if not buf.startswith(MAGIC):
+        raise ValueError("not a sheet cache entry")
+    pos = len(MAGIC)
+    (header_len,) = struct.unpack_from("<I", buf, pos)
+    pos += 4
+    header = json.loads(buf[pos : pos + header_len].decode("utf-8"))
+    pos += header_len
+    swap = header["byteorder"] != sys.byteorder
+
+    def take(typecode: str, count: int) -> "array[int]":
+        nonlocal pos
+        arr = array(typecode)
+        size = arr.itemsize * count
+        arr.frombytes(buf[pos : pos + size])
+        pos += size
+        if swap:
+            arr.byteswap()
+        return arr
+
+    offsets = take("Q", header["values"] + 1)
+    blob = buf[pos : pos + offsets[-1]]
+    pos += offsets[-1]
+    values: List[Optional[str]] = [None]
+    values.extend(blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(header["values"]))
+    columns = [take("I", header["rows"]) for _ in header["headers"]]
+    if pos != len(buf):
+        raise ValueError("truncated or oversized sheet cache entry")
+    return SheetData(header["headers"], values, columns)
+
+
+class ParseCache:
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, digest: str, sheet_name: str) -> str:
+        sheet_key = hashlib.sha256(sheet_name.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}-{sheet_key}{SUFFIX}")
+
+    def get(self, digest: str, sheet_name: str) -> Optional[SheetData]:
+        path = self._path(digest, sheet_name)
+        try:
+            with open(path, "rb") as f:
+                data = decode_sheet(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, struct.error):
+            # Corrupt or foreign entry: drop it and fall back to parsing.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)
+        return data
+
+    def put(self, digest: str, sheet_name: str, data: SheetData) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_sheet(data))
+            os.replace(tmp_path, self._path(digest, sheet_name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,204 @@
+"""Run instrumentation for the DUO import: phase timers, memory, HTTP counters.
+
+Phases accumulate wall time (perf_counter) and process CPU time; phases that
+overlap (pipeline mode) each see the whole process's CPU while they run.
+HTTP requests are grouped by method + table/RPC name, with byte counts and a
+latency histogram. Other components can attach their own counters with
+`detail()` (e.g. normalization cache hits). `summary()` is a JSON-serialisable dict.
+"""
+
+from __future__ import annotations
+
+import bisect
+import cProfile
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def peak_rss_bytes(who: str = "self") -> Optional[int]:
+    """Peak resident set size of this process (or its reaped children)."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def mib(value: Optional[int]) -> Optional[float]:
+    return None if value is None else round(value / (1024 * 1024), 1)
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            "max_ms": round(self.max_ms, 1),
+            "latency_ms": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class HttpStats:
+    """Thread-safe request counters; pass `observe` as a RestClient observer."""
+
+    def __init__(self) -> None:
+        self.endpoints: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, path: str, status: int, sent: int, received: int, seconds: float) -> None:
+        endpoint = f"{method} {path.split('?', 1)[0]}"
+        ms = seconds * 1000
+        with self._lock:
+            e = self.endpoints[endpoint]
+            e.requests += 1
+            if status == 0 or status >= 400:
+                e.errors += 1
+            e.bytes_sent += sent
+            e.bytes_received += received
+            e.total_ms += ms
+            e.max_ms = max(e.max_ms, ms)
+            e.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {name: e.summary() for name, e in sorted(self.endpoints.items())}
+        return {
+            "requests": sum(e["requests"] for e in endpoints.values()),
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "bytes_sent": sum(e["bytes_sent"] for e in endpoints.values()),
+            "bytes_received": sum(e["bytes_received"] for e in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+class RunStats:
+    """Collects phase timings, counters, memory and HTTP stats for one run."""
+
+    def __init__(self, profile_path: Optional[str] = None, trace_memory: bool = False) -> None:
+        self.profile_path = profile_path
+        self.trace_memory = trace_memory
+        self.http = HttpStats()
+        self.counts: Dict[str, int] = {}
+        self.details: Dict[str, Any] = {}
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self._order: List[str] = []
+        self._lock = threading.Lock()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._started_at = ""
+        self._wall = 0.0
+        self._cpu = 0.0
+        self._elapsed: Optional[float] = None
+        self._traced_peak: Optional[int] = None
+
+    def start(self) -> None:
+        self._started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile_path:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        if self._elapsed is not None:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self._elapsed = time.perf_counter() - self._wall
+        self._cpu = time.process_time() - self._cpu
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def timed(self, name: str, fn: Callable[..., T], *args: Any) -> T:
+        """Call fn(*args) inside phase `name` (handy with asyncio.to_thread)."""
+        with self.phase(name):
+            return fn(*args)
+
+    def add_phase(self, name: str, wall_s: float, cpu_s: float) -> None:
+        with self._lock:
+            entry = self.phases.get(name)
+            if entry is None:
+                entry = self.phases[name] = {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0}
+                self._order.append(name)
+            entry["wall_s"] += wall_s
+            entry["cpu_s"] += cpu_s
+            entry["calls"] += 1
+
+    def count(self, name: str, value: int) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def detail(self, name: str, value: Any) -> None:
+        """Attach a JSON-serialisable value to the summary under `name`."""
+        with self._lock:
+            self.details[name] = value
+
+    def summary(self) -> Dict[str, Any]:
+        self.stop()
+        phases = {
+            name: {
+                "wall_s": round(self.phases[name]["wall_s"], 3),
+                "cpu_s": round(self.phases[name]["cpu_s"], 3),
+                "calls": int(self.phases[name]["calls"]),
+            }
+            for name in self._order
+        }
+        summary: Dict[str, Any] = {
+            "started_at": self._started_at,
+            "wall_s": round(self._elapsed or 0.0, 3),
+            "cpu_s": round(self._cpu, 3),
+            "peak_rss_mb": mib(peak_rss_bytes()),
+            "phases": phases,
+            "counts": dict(self.counts),
+            "http": self.http.summary(),
+            **self.details,
+        }
+        children = peak_rss_bytes("children")
+        if children:
+            summary["peak_rss_children_mb"] = mib(children)
+        if self._traced_peak is not None:
+            summary["traced_peak_mb"] = mib(self._traced_peak)
+        if self.profile_path:
+            summary["profile"] = self.profile_path
+        return summary
@@ -0,0 +1,372 @@
+"""Match DUO vestigingen to existing `schools` rows.
+
+Exact passes (DUO id, postcode + house number, name + postcode, optional
+name-only) run first, all as dict lookups. When postcode centroids are
+available, DUO rows that are still unmatched (or ambiguous, e.g. branches
+sharing a vestigingsnaam) are resolved against schools on a uniform spatial
+grid within a radius. With a fuzzy threshold (opt-in), anything left goes
+through a fuzzy pass: candidates come from blocking (same postcode, shared
+rare name/street tokens, shared name trigrams) and are scored with trigram
+similarity, so no DUO row is ever compared against the whole catalog.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import math
+from collections import Counter, defaultdict
+from typing import Any, Dict, FrozenSet, Iterator, List, Mapping, Optional, Set, Tuple
+
+from duo_normalize import cached, norm_postcode, norm_text, normalize_column, parse_address_components, street_tokens
+
+School = Dict[str, Any]
+
+# Matching methods recorded per decision.
+MANUAL = "manual"
+DUO_ID = "duo_id"
+ADDRESS = "address"
+NAME_POSTCODE = "name_postcode"
+NAME_ONLY = "name_only"
+SPATIAL = "spatial"
+FUZZY = "fuzzy"
+
+Point = Tuple[float, float]
+
+# DUO row fields match() reads.
+MATCH_INPUT_FIELDS = ["duo_school_id", "name", "postcode", "house_nr", "house_nr_suffix", "street"]
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEGREE = 111_320.0
+
+# Postings longer than this are too common to be useful for blocking.
+MAX_BLOCK_POSTINGS = 50
+# The best fuzzy candidate must beat the runner-up by at least this much.
+FUZZY_MARGIN = 0.05
+
+
+@cached
+def trigrams(text: str) -> FrozenSet[str]:
+    if not text:
+        return frozenset()
+    padded = f"  {text} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def distance_m(a: Point, b: Point) -> float:
+    """Haversine distance between two (lat, lng) points."""
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+def read_postcode_centroids(path: str) -> Dict[str, Point]:
+    """Read a postcode,lat,lng CSV (PC6 like 1012AB and/or PC4 like 1012)."""
+    centroids: Dict[str, Point] = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            postcode = norm_postcode(row.get("postcode"))
+            lat = row.get("lat")
+            lng = row.get("lng") or row.get("lon")
+            if not postcode or not lat or not lng:
+                continue
+            try:
+                centroids[postcode] = (float(lat), float(lng))
+            except ValueError:
+                continue
+    return centroids
+
+
+class SpatialGrid:
+    """Uniform grid over (lat, lng); a radius query only visits the 3x3 cells around the point."""
+
+    def __init__(self, cell_m: float, ref_lat: float = 52.37) -> None:
+        self.cell_lat = cell_m / METERS_PER_DEGREE
+        # Cells are sized in longitude for ref_lat + 2 degrees, where a degree of
+        # longitude is shorter, so they come out slightly wider in degrees and are
+        # never narrower than cell_m anywhere in the Netherlands.
+        self.cell_lng = cell_m / (METERS_PER_DEGREE * math.cos(math.radians(ref_lat + 2)))
+        self.cells: Dict[Tuple[int, int], List[Tuple[Point, int]]] = defaultdict(list)
+
+    def _cell(self, point: Point) -> Tuple[int, int]:
+        return math.floor(point[0] / self.cell_lat), math.floor(point[1] / self.cell_lng)
+
+    def add(self, point: Point, pos: int) -> None:
+        self.cells[self._cell(point)].append((point, pos))
+
+    def near(self, point: Point, radius_m: float) -> Iterator[Tuple[float, int]]:
+        """Yield (distance_m, pos) for entries within radius_m (radius_m <= cell size)."""
+        row, col = self._cell(point)
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                for other, pos in self.cells.get((row + dr, col + dc), ()):
+                    dist = distance_m(point, other)
+                    if dist <= radius_m:
+                        yield dist, pos
+
+
+class MatchResult:
+    def __init__(
+        self,
+        target: Optional[School] = None,
+        method: Optional[str] = None,
+        ambiguous: bool = False,
+        score: Optional[float] = None,
+    ) -> None:
+        self.target = target
+        self.method = method
+        self.ambiguous = ambiguous
+        # Similarity score of spatial/fuzzy matches (None for exact passes and tie-breaks).
+        self.score = score
+
+
+class SchoolMatcher:
+    def __init__(
+        self,
+        allow_name_only: bool = False,
+        fuzzy_threshold: Optional[float] = None,
+        centroids: Optional[Dict[str, Point]] = None,
+        radius_m: float = 300.0,
+        spatial_threshold: float = 0.75,
+    ) -> None:
+        self.allow_name_only = allow_name_only
+        self.fuzzy_threshold = fuzzy_threshold
+        self.centroids = centroids or {}
+        self.radius_m = radius_m
+        self.spatial_threshold = spatial_threshold
+        self.grid = SpatialGrid(radius_m)
+        self._pos_by_id: Dict[str, int] = {}
+        self._points: List[Optional[Point]] = []
+        self.schools: List[School] = []
+        self.by_id: Dict[str, School] = {}
+        self.by_duo: Dict[str, School] = {}
+        self.by_name_postcode: Dict[tuple, List[School]] = defaultdict(list)
+        self.by_postcode_house: Dict[tuple, List[School]] = defaultdict(list)
+        self.by_name: Dict[str, List[School]] = defaultdict(list)
+        # Fuzzy-pass indexes hold positions in self.schools.
+        self.by_postcode: Dict[str, List[int]] = defaultdict(list)
+        self.token_index: Dict[str, List[int]] = defaultdict(list)
+        self.trigram_index: Dict[str, List[int]] = defaultdict(list)
+        self._name_trigrams: List[FrozenSet[str]] = []
+        self._street_tokens: List[FrozenSet[str]] = []
+        self._postcodes: List[str] = []
+
+    def add(self, s: School) -> None:
+        """Register a school; lookup indexes are built lazily on the first match()."""
+        pos = len(self.schools)
+        self.schools.append(s)
+        if s.get("id"):
+            self.by_id[s["id"]] = s
+            self._pos_by_id[s["id"]] = pos
+
+    def add_all(self, schools: List[School]) -> None:
+        for s in schools:
+            self.add(s)
+
+    def _build_indexes(self) -> None:
+        start = len(self._points)
+        new = self.schools[start:]
+        if not new:
+            return
+        # Column-wise, so each distinct name/postcode/address is normalized once.
+        names = normalize_column(norm_text, (s.get("name") for s in new))
+        postcodes = normalize_column(norm_postcode, (s.get("postcode") for s in new))
+        addresses = normalize_column(parse_address_components, (s.get("address") for s in new))
+        streets = normalize_column(street_tokens, (s.get("street") or s.get("address") for s in new))
+        for k, s in enumerate(new):
+            self._index(start + k, s, names[k], postcodes[k], addresses[k], streets[k])
+
+    def _index(
+        self,
+        pos: int,
+        s: School,
+        name_key: str,
+        postcode_key: str,
+        address: Tuple[str, Optional[str]],
+        tokens: FrozenSet[str],
+    ) -> None:
+        address_postcode, address_house = address
+        address_house_norm = address_house or ""
+        point = None
+        if s.get("lat") is not None and s.get("lng") is not None:
+            point = (float(s["lat"]), float(s["lng"]))
+            self.grid.add(point, pos)
+        self._points.append(point)
+        if s.get("duo_school_id"):
+            self.by_duo[s["duo_school_id"]] = s
+        if name_key and postcode_key:
+            self.by_name_postcode[(name_key, postcode_key)].append(s)
+        if name_key:
+            self.by_name[name_key].append(s)
+        if address_postcode and address_house_norm:
+            self.by_postcode_house[(address_postcode, address_house_norm)].append(s)
+
+        postcode = postcode_key or address_postcode
+        self._postcodes.append(postcode)
+        if postcode:
+            self.by_postcode[postcode].append(pos)
+        name_grams = trigrams(name_key)
+        self._name_trigrams.append(name_grams)
+        for gram in name_grams:
+            self.trigram_index[gram].append(pos)
+        self._street_tokens.append(tokens)
+        for token in set(name_key.split()) | tokens:
+            self.token_index[token].append(pos)
+
+    def match(self, d: Mapping[str, Any], manual: Optional[Mapping[str, str]] = None) -> MatchResult:
+        """Match one DUO row (as built in main()); `manual` is its match-file row, if any."""
+        self._build_indexes()
+        duo_id = d["duo_school_id"]
+        name_key = norm_text(d.get("name"))
+        postcode_key = d.get("postcode") or ""
+        point = self.locate(postcode_key)
+
+        target: Optional[School] = None
+        if manual:
+            school_id_override = manual.get("school_id") or ""
+            if school_id_override:
+                target = self.by_id.get(school_id_override)
+            else:
+                manual_name = norm_text(manual.get("school_name") or "")
+                if manual_name:
+                    candidates = self.by_name.get(manual_name, [])
+                    if len(candidates) == 1:
+                        target = candidates[0]
+            if target:
+                return MatchResult(target, MANUAL)
+        else:
+            target = self.by_duo.get(duo_id)
+            if target:
+                return MatchResult(target, DUO_ID)
+
+        if postcode_key and d.get("house_nr"):
+            duo_house_norm = f"{d.get('house_nr') or ''}{d.get('house_nr_suffix') or ''}".strip()
+            candidates = self.by_postcode_house.get((postcode_key, duo_house_norm), [])
+            if len(candidates) == 1:
+                return MatchResult(candidates[0], ADDRESS)
+            if len(candidates) > 1:
+                return self.break_tie(candidates, point)
+        if name_key and postcode_key:
+            candidates = self.by_name_postcode.get((name_key, postcode_key), [])
+            if len(candidates) == 1:
+                return MatchResult(candidates[0], NAME_POSTCODE)
+            if len(candidates) > 1:
+                return self.break_tie(candidates, point)
+        if self.allow_name_only and name_key:
+            candidates = self.by_name.get(name_key, [])
+            if len(candidates) == 1:
+                return MatchResult(candidates[0], NAME_ONLY)
+            if len(candidates) > 1:
+                return self.break_tie(candidates, point)
+
+        if point is not None:
+            found = self.spatial_match(name_key, point)
+            if found:
+                return MatchResult(found[0], SPATIAL, score=found[1])
+        if self.fuzzy_threshold is not None:
+            found = self.fuzzy_match(name_key, postcode_key, d.get("street"))
+            if found:
+                return MatchResult(found[0], FUZZY, score=found[1])
+        return MatchResult()
+
+    def fingerprint(self, d: Mapping[str, Any], manual: Optional[Mapping[str, str]] = None) -> str:
+        """Digest of everything match() looks at for this row, besides the school catalog."""
+        inputs = [
+            [d.get(f) for f in MATCH_INPUT_FIELDS],
+            dict(manual) if manual else None,
+            self.locate(d.get("postcode") or ""),
+            [self.allow_name_only, self.fuzzy_threshold, self.radius_m, self.spatial_threshold],
+        ]
+        encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def locate(self, postcode: str) -> Optional[Point]:
+        if not postcode or not self.centroids:
+            return None
+        return self.centroids.get(postcode) or self.centroids.get(postcode[:4])
+
+    def break_tie(self, candidates: List[School], point: Optional[Point]) -> MatchResult:
+        """Resolve several exact-key candidates to the only one within the radius, if any."""
+        if point is not None:
+            near = []
+            for s in candidates:
+                pos = self._pos_by_id.get(s.get("id") or "")
+                other = self._points[pos] if pos is not None else None
+                if other is not None and distance_m(point, other) <= self.radius_m:
+                    near.append(s)
+            if len(near) == 1:
+                return MatchResult(near[0], SPATIAL)
+        return MatchResult(ambiguous=True)
+
+    def spatial_match(self, name_key: str, point: Point) -> Optional[Tuple[School, float]]:
+        """Best name match among schools within the radius; proximity is the address evidence."""
+        if not name_key:
+            return None
+        grams = trigrams(name_key)
+        scored = sorted(
+            (0.8 * dice(grams, self._name_trigrams[pos]) + 0.2 * (1 - dist / self.radius_m), pos)
+            for dist, pos in self.grid.near(point, self.radius_m)
+        )
+        return self.pick(scored, self.spatial_threshold)
+
+    def pick(self, scored: List[Tuple[float, int]], threshold: float) -> Optional[Tuple[School, float]]:
+        """(school, score) of the best ascending (score, pos) pair if it clears the threshold and the margin."""
+        if not scored:
+            return None
+        best_score, best_pos = scored[-1]
+        if best_score < threshold:
+            return None
+        if len(scored) > 1 and best_score - scored[-2][0] < FUZZY_MARGIN:
+            return None
+        return self.schools[best_pos], best_score
+
+    def candidates(self, name_key: str, postcode: str, street_tokens: FrozenSet[str]) -> Set[int]:
+        """Blocking: schools sharing the postcode, a rare token, or enough rare trigrams."""
+        found: Set[int] = set(self.by_postcode.get(postcode, ())) if postcode else set()
+        for token in set(name_key.split()) | street_tokens:
+            postings = self.token_index.get(token, ())
+            if len(postings) <= MAX_BLOCK_POSTINGS:
+                found.update(postings)
+        grams = trigrams(name_key)
+        if grams:
+            shared: Counter = Counter()
+            for gram in grams:
+                postings = self.trigram_index.get(gram, ())
+                if len(postings) <= MAX_BLOCK_POSTINGS:
+                    shared.update(postings)
+            need = max(2, len(grams) // 2)
+            found.update(pos for pos, n in shared.items() if n >= need)
+        return found
+
+    def score(self, pos: int, grams: FrozenSet[str], postcode: str, street_tokens: FrozenSet[str]) -> float:
+        """0.8 * name trigram similarity + 0.2 * address agreement (postcode, else street)."""
+        name_sim = dice(grams, self._name_trigrams[pos])
+        if postcode and postcode == self._postcodes[pos]:
+            address_sim = 1.0
+        elif street_tokens and street_tokens & self._street_tokens[pos]:
+            address_sim = 0.5
+        else:
+            address_sim = 0.0
+        if address_sim == 0.0 and not self.allow_name_only:
+            # Without any address evidence this would be a (fuzzy) name-only match.
+            return 0.0
+        return 0.8 * name_sim + 0.2 * address_sim
+
+    def fuzzy_match(self, name_key: str, postcode: str, street: Optional[str]) -> Optional[Tuple[School, float]]:
+        if not name_key or self.fuzzy_threshold is None:
+            return None
+        tokens = street_tokens(street)
+        grams = trigrams(name_key)
+        scored = sorted(
+            (self.score(pos, grams, postcode, tokens), pos)
+            for pos in self.candidates(name_key, postcode, tokens)
+        )
+        return self.pick(scored, self.fuzzy_threshold)
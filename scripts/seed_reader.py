@@ -0,0 +1,180 @@
+"""Seed inputs for the DUO import: an .xlsx workbook or plain-text sheet exports.
+
+A seed is either an .xlsx workbook or a directory with one file per sheet,
+named after the sheet:
+
+    seed_2025/Schools_AMS_main.csv
+    seed_2025/Metrics_long.csv
+
+Sheet files may be .csv, .tsv (or .tab) or .ndjson (or .jsonl), optionally
+gzipped (.csv.gz, ...); the reader is picked from the extension. Text sheets
+are streamed through the csv module or line by line and yield the same rows
+as the xlsx reader: a header list, then one list of cell values per row with
+empty cells as None.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import hashlib
+import json
+import os
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from parse_cache import file_digest
+from xlsx_reader import Row, SheetData, SheetNotFound, Workbook
+
+# Reads an open text sheet: (headers, lazy rows). The caller owns and closes the file.
+SheetReader = Callable[[IO[str]], Tuple[List[str], Iterator[Row]]]
+
+
+def open_text(path: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+def delimited_reader(delimiter: str) -> SheetReader:
+    def read(f: IO[str]) -> Tuple[List[str], Iterator[Row]]:
+        reader = csv.reader(f, delimiter=delimiter)
+        headers = [h.strip() for h in next(reader, [])]
+        if not headers:
+            return [], iter(())
+
+        def rows() -> Iterator[Row]:
+            width = len(headers)
+            for record in reader:
+                if not record:
+                    continue
+                if len(record) < width:
+                    record += [""] * (width - len(record))
+                yield [value or None for value in record[:width]]
+
+        return headers, rows()
+
+    return read
+
+
+def cell_text(value: object) -> Optional[str]:
+    """A JSON value as the string an xlsx cell would hold (1/0 for booleans)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def read_ndjson(f: IO[str]) -> Tuple[List[str], Iterator[Row]]:
+    """One JSON object per line; the first object's keys are the headers."""
+    lines = (line for line in f if line.strip())
+    first = next(lines, None)
+    if first is None:
+        return [], iter(())
+    record = json.loads(first)
+    headers = list(record)
+
+    def rows() -> Iterator[Row]:
+        yield [cell_text(record.get(h)) for h in headers]
+        for line in lines:
+            obj = json.loads(line)
+            yield [cell_text(obj.get(h)) for h in headers]
+
+    return headers, rows()
+
+
+# Sheet file extension -> reader, in lookup order.
+READERS: Dict[str, SheetReader] = {
+    ".csv": delimited_reader(","),
+    ".tsv": delimited_reader("\t"),
+    ".tab": delimited_reader("\t"),
+    ".ndjson": read_ndjson,
+    ".jsonl": read_ndjson,
+}
+
+
+def sheet_format(path: str) -> Optional[str]:
+    """The READERS extension of a sheet file (".csv" for both x.csv and x.csv.gz)."""
+    base = path[:-3] if path.endswith(".gz") else path
+    ext = os.path.splitext(base)[1].lower()
+    return ext if ext in READERS else None
+
+
+class SheetDirectory:
+    """A directory of `<sheet name>.<ext>` text exports, opened like a Workbook.
+
+    Sheet files stay open until close(), whether or not their rows were read
+    to the end; rows must be consumed before the directory is closed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._files: Dict[str, str] = {}
+        self._open: List[IO[str]] = []
+        rank: Dict[str, int] = {}
+        order = list(READERS)
+        for entry in sorted(os.listdir(path)):
+            ext = sheet_format(entry)
+            if ext is None:
+                continue
+            name = entry[: -len(ext) - (3 if entry.endswith(".gz") else 0)]
+            # Several exports of one sheet: the first format in READERS wins.
+            if name not in rank or order.index(ext) < rank[name]:
+                rank[name] = order.index(ext)
+                self._files[name] = os.path.join(path, entry)
+
+    def __enter__(self) -> "SheetDirectory":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        while self._open:
+            self._open.pop().close()
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._files)
+
+    def sheet(self, sheet_name: str) -> Tuple[List[str], Iterator[Row]]:
+        path = self._files.get(sheet_name)
+        if path is None:
+            raise SheetNotFound(sheet_name)
+        f = open_text(path)
+        self._open.append(f)
+        return READERS[sheet_format(path) or ""](f)
+
+    def digest(self) -> str:
+        """Content hash over every sheet file (name + SHA-256)."""
+        h = hashlib.sha256()
+        for name, path in sorted(self._files.items()):
+            h.update(f"{name}\0{file_digest(path)}\0".encode("utf-8"))
+        return h.hexdigest()
+
+
+Seed = Union[Workbook, SheetDirectory]
+
+
+def open_seed(path: str) -> Seed:
+    if os.path.isdir(path):
+        return SheetDirectory(path)
+    return Workbook(path)
+
+
+def seed_digest(path: str) -> str:
+    if os.path.isdir(path):
+        return SheetDirectory(path).digest()
+    return file_digest(path)
+
+
+def read_seed_sheet(path: str, sheet_name: str) -> SheetData:
+    with open_seed(path) as seed:
+        headers, rows = seed.sheet(sheet_name)
+        return SheetData.from_rows(headers, rows)
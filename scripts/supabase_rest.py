@@ -0,0 +1,594 @@
+"""Small Supabase/PostgREST client shared by the import/export scripts.
+
+Connections are persistent `http.client` connections kept in a pool, so a
+sequence of writes pays the TCP/TLS handshake once per pooled connection, not
+once per request. Transient failures (connection resets, 429, 5xx) are retried
+with exponential backoff and jitter, honouring Retry-After when present; a
+request that is not idempotent (a plain POST insert) is only resent when the
+server cannot have applied it: 429/503, or no connection could be made.
+Request bodies can be gzipped (opt-in: PostgREST itself does not inflate
+them, a gateway in front of it has to; a 400/415 answer turns it off again).
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import http.client
+import json
+import queue
+import random
+import re
+import select
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+CONTENT_RANGE_RE = re.compile(r"^\s*(?:\w+\s+)?(\*|(\d+)-(\d+))/(\*|\d+)\s*$")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses that mean the request was turned away unprocessed: safe to resend any request.
+REJECTED_STATUSES = {429, 503}
+
+# Bodies below this size are sent as-is even with gzip_requests.
+GZIP_MIN_BYTES = 1024
+
+JSON_SEPARATORS = (",", ":")
+
+
+class HttpError(RuntimeError):
+    def __init__(self, status: int, reason: str, details: str, headers: Mapping[str, str]) -> None:
+        super().__init__(f"HTTP {status} {reason} - {details}")
+        self.status = status
+        self.reason = reason
+        self.details = details
+        self.headers = headers
+
+
+class ConnectFailed(ConnectionError):
+    """No connection could be opened; nothing was sent, so any request may be retried."""
+
+
+def is_idempotent(method: str, headers: Optional[Mapping[str, str]] = None) -> bool:
+    """Whether resending the request cannot apply it twice: any non-POST, or an upsert POST."""
+    if method != "POST":
+        return True
+    return "merge-duplicates" in (headers or {}).get("Prefer", "")
+
+
+def connection_dropped(conn: http.client.HTTPConnection) -> bool:
+    """An idle keep-alive connection the server has closed (its socket reads EOF)."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class Response:
+    def __init__(self, status: int, headers: Mapping[str, str], data: bytes, elapsed: float = 0.0) -> None:
+        self.status = status
+        self.headers = headers
+        self.data = data
+        # Seconds from sending the request on a pooled connection to the full body (no pool wait).
+        self.elapsed = elapsed
+
+    def json(self) -> Any:
+        if not self.data:
+            return None
+        return json.loads(self.data.decode("utf-8"))
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class RestClient:
+    """Pooled keep-alive client for one Supabase REST base URL.
+
+    `path` arguments are relative to `base_url` (e.g. "schools?id=eq.1").
+    Safe to share between threads; each request holds one connection.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        pool_size: int = 4,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 60.0,
+        observer: Optional[Callable[[str, str, int, int, int, float], None]] = None,
+        gzip_requests: bool = False,
+    ) -> None:
+        parsed = urllib.parse.urlsplit(base_url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname or ""
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip("/")
+        self.headers = headers
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        # observer(method, path, status, bytes sent, bytes received, seconds) per attempt; status 0 = no response.
+        # For answered attempts, seconds is the round trip on the connection (no wait for a free pool slot).
+        self.observer = observer
+        self.gzip_requests = gzip_requests
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    def __enter__(self) -> "RestClient":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def url(self, path: str) -> str:
+        return f"{self.base_path}/{path.lstrip('/')}"
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """(connection, reused): an idle pooled connection the server has not closed, else a new one.
+
+        Raises ConnectFailed if a new connection cannot be opened.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not connection_dropped(conn):
+                return conn, True
+            conn.close()
+        conn = self._connect()
+        try:
+            conn.connect()
+        except OSError as e:
+            conn.close()
+            raise ConnectFailed(f"cannot connect to {self.host}: {e}") from e
+        return conn, False
+
+    def _send(
+        self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes], idempotent: bool = True
+    ) -> Tuple[int, str, Mapping[str, str], bytes, int, float]:
+        """(status, reason, headers, body, bytes on the wire, seconds) for one attempt.
+
+        The clock starts once a pool slot is held, so local contention for
+        connections is not reported as server latency. An idempotent request
+        whose reused connection turns out closed by the server is resent once
+        on a new connection, without a backoff.
+        """
+        with self._slots:
+            started = time.perf_counter()
+            conn, reused = self._checkout()
+            while True:
+                try:
+                    conn.request(method, url, body=body, headers=headers)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                    elapsed = time.perf_counter() - started
+                    break
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    if not (reused and idempotent):
+                        raise
+                    conn, reused = self._checkout()
+                    reused = False
+                except BaseException:
+                    conn.close()
+                    raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        # HTTPMessage: case-insensitive header lookups.
+        resp_headers = resp.msg
+        received = len(data)
+        if (resp_headers.get("Content-Encoding") or "").lower() == "gzip" and data:
+            data = gzip.decompress(data)
+        return resp.status, resp.reason, resp_headers, data, received, elapsed
+
+    def retry_delay(self, attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        """Seconds to wait before retry `attempt`: Retry-After if given, else jittered exponential backoff."""
+        retry_after = retry_after_seconds(headers or {})
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        base = min(self.max_backoff, self.backoff * (2**attempt))
+        return random.uniform(base / 2, base)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        retries: Optional[int] = None,
+        idempotent: Optional[bool] = None,
+    ) -> Response:
+        """Send a request, retrying connection errors, 429 and 5xx responses.
+
+        A request that is not idempotent (default: see is_idempotent) is only
+        retried on 429/503 and on ConnectFailed, never after its bytes may
+        have reached the server. Raises HttpError (a RuntimeError) for any
+        final status >= 400.
+        """
+        if idempotent is None:
+            idempotent = is_idempotent(method, headers)
+        retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+        url = self.url(path)
+        req_headers = {**self.headers, "Accept-Encoding": "gzip", **(headers or {})}
+        plain_body = body
+        if self.gzip_requests and body is not None and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            req_headers["Content-Encoding"] = "gzip"
+        max_retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                status, reason, resp_headers, data, received, elapsed = self._send(
+                    method, url, req_headers, body, idempotent
+                )
+            except (ConnectionError, http.client.HTTPException, TimeoutError, OSError) as e:
+                if self.observer is not None:
+                    self.observer(method, path, 0, len(body or b""), 0, time.perf_counter() - started)
+                if attempt >= max_retries or not (idempotent or isinstance(e, ConnectFailed)):
+                    raise
+                time.sleep(self.retry_delay(attempt))
+                attempt += 1
+                continue
+            if self.observer is not None:
+                self.observer(method, path, status, len(body or b""), received, elapsed)
+            if status in retry_statuses and attempt < max_retries:
+                time.sleep(self.retry_delay(attempt, resp_headers))
+                attempt += 1
+                continue
+            if status in (400, 415) and body is not plain_body:
+                # The server does not take compressed bodies (a plain PostgREST reads
+                # them as invalid JSON): resend this one plain and stop compressing.
+                self.gzip_requests = False
+                body = plain_body
+                req_headers.pop("Content-Encoding", None)
+                continue
+            if status >= 400:
+                raise HttpError(status, reason, data.decode("utf-8", "replace"), resp_headers)
+            return Response(status, resp_headers, data, elapsed)
+
+    def request_json(
+        self, method: str, path: str, headers: Optional[Dict[str, str]] = None, body: Optional[bytes] = None
+    ) -> Any:
+        return self.request(method, path, headers, body).json()
+
+
+def parse_content_range(value: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """Parse "0-999/2345" (or "*/0", "0-999/*") into (start, end, total)."""
+    m = CONTENT_RANGE_RE.match(value or "")
+    if not m:
+        return None, None, None
+    start = int(m.group(2)) if m.group(2) else None
+    end = int(m.group(3)) if m.group(3) else None
+    total = int(m.group(4)) if m.group(4) != "*" else None
+    return start, end, total
+
+
+def fetch_pages(
+    client: RestClient,
+    path: str,
+    params: Dict[str, str],
+    page_size: int = 1000,
+    workers: int = 4,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield every row of a PostgREST collection, one page at a time, in order.
+
+    The first page is requested with `Prefer: count=exact`; the total from its
+    Content-Range tells us how many pages remain, and those are fetched
+    concurrently with at most `workers` requests in flight. `params` must
+    include a total `order` so pages are stable (e.g. "name.asc,id.asc").
+    The page size actually served is taken from the first response, so a
+    server-side max-rows cap below `page_size` is handled.
+    """
+    query = urllib.parse.urlencode(params)
+    page_path = f"{path}?{query}" if query else path
+
+    def get(offset: int, limit: int, count: bool = False) -> Response:
+        page_headers = {"Range-Unit": "items", "Range": f"{offset}-{offset + limit - 1}"}
+        if count:
+            page_headers["Prefer"] = "count=exact"
+        return client.request("GET", page_path, page_headers)
+
+    first = get(0, page_size, count=True)
+    rows = first.json() or []
+    yield rows
+    start, end, total = parse_content_range(first.headers.get("Content-Range"))
+    step = (end - start + 1) if start is not None and end is not None else len(rows)
+    if not rows or step <= 0:
+        return
+
+    if total is None:
+        # No exact count available: walk pages sequentially until a short page.
+        offset = step
+        while True:
+            rows = get(offset, step).json() or []
+            if rows:
+                yield rows
+            if len(rows) < step:
+                return
+            offset += step
+
+    offsets = list(range(step, total, step))
+    if not offsets:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # Keep a bounded window of requests in flight; yield strictly in order.
+        pending = [pool.submit(get, o, step) for o in offsets[:workers]]
+        next_i = len(pending)
+        while pending:
+            page = pending.pop(0).result().json() or []
+            if next_i < len(offsets):
+                pending.append(pool.submit(get, offsets[next_i], step))
+                next_i += 1
+            if page:
+                yield page
+
+
+def last_csv_record(data: bytes) -> bytes:
+    """The last record of a CSV body (quoted fields may contain newlines).
+
+    A newline ends a record only outside quotes, i.e. when an even number of
+    quote characters follows it up to the end of the (complete) body.
+    """
+    end = len(data.rstrip(b"\r\n"))
+    pos = end
+    while True:
+        nl = data.rfind(b"\n", 0, pos)
+        if nl < 0 or data.count(b'"', nl + 1, end) % 2 == 0:
+            return data[nl + 1 : end]
+        pos = nl
+
+
+def fetch_csv_pages(
+    client: RestClient,
+    path: str,
+    params: Dict[str, str],
+    key_column: str = "id",
+    key_field: Optional[str] = None,
+    page_size: int = 1000,
+) -> Iterator[Tuple[bytes, int]]:
+    """Yield a PostgREST collection as raw CSV bytes, keyset-paginated on `key_column`.
+
+    Each page is requested with `Accept: text/csv` (gzip on the wire), ordered
+    by `key_column` and filtered to keys after the previous page's last row,
+    so no page costs an OFFSET scan and concurrent writes cannot shift rows
+    between pages. The body is passed through undecoded: yields (header line, 0)
+    once, then (records + newline, row count) per page. Only the last record
+    of a page is parsed, to read its key (`key_field`, the column's name in
+    the CSV header, defaults to `key_column`). Memory is bounded by one page.
+    """
+    key_field = key_field or key_column
+    headers = {"Accept": "text/csv"}
+    last_key: Optional[str] = None
+    key_pos: Optional[int] = None
+    while True:
+        page_params = {**params, "order": f"{key_column}.asc", "limit": str(page_size)}
+        if last_key is not None:
+            page_params[key_column] = f"gt.{last_key}"
+        resp = client.request("GET", f"{path}?{urllib.parse.urlencode(page_params)}", headers)
+        header, _, body = resp.data.partition(b"\n")
+        body = body.rstrip(b"\r\n")
+        if not body:
+            return
+        if key_pos is None:
+            columns = next(csv.reader([header.decode("utf-8")]))
+            if key_field not in columns:
+                raise ValueError(f"CSV export needs the {key_field} column for keyset pagination")
+            key_pos = columns.index(key_field)
+            yield header.rstrip(b"\r") + b"\n", 0
+        start, end, _ = parse_content_range(resp.headers.get("Content-Range"))
+        rows = end - start + 1 if start is not None and end is not None else body.count(b"\n") + 1
+        record = last_csv_record(body).decode("utf-8")
+        last_key = next(csv.reader([record]))[key_pos]
+        yield body + b"\n", rows
+
+
+class WriteStats:
+    def __init__(self) -> None:
+        self.rows = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.throttled = 0
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class AdaptiveBatchWriter:
+    """POST rows as JSON arrays with several batches in flight.
+
+    Rows are dicts or pre-encoded JSON objects (bytes), appended to one
+    reused buffer. With `columns`, the path gets `?columns=` and dict rows
+    leave out null fields (PostgREST stores the omitted columns as NULL).
+
+    Batches are cut by encoded size (not row count). The size and the number
+    of concurrent requests grow while responses come back faster than
+    `target_latency` and shrink multiplicatively on slow responses or
+    429/503; throttled batches wait for Retry-After (or a backoff) and are
+    resent, and every sender observes the same pause. Other failures (5xx,
+    timeouts, resets) pause without shrinking and are only resent when the
+    write is idempotent, i.e. an upsert (`Prefer: resolution=merge-duplicates`);
+    a plain insert the server may already have committed fails instead.
+    """
+
+    def __init__(
+        self,
+        client: RestClient,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        max_in_flight: int = 4,
+        batch_bytes: int = 128 * 1024,
+        min_batch_bytes: int = 16 * 1024,
+        max_batch_bytes: int = 2 * 1024 * 1024,
+        max_batch_rows: int = 5000,
+        target_latency: float = 1.0,
+        max_attempts: int = 8,
+        columns: Optional[Sequence[str]] = None,
+    ) -> None:
+        self.client = client
+        if columns:
+            path += ("&" if "?" in path else "?") + "columns=" + ",".join(columns)
+        self.path = path
+        self.omit_nulls = bool(columns)
+        self.headers = headers or {}
+        self.idempotent = is_idempotent("POST", self.headers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.concurrency = min(2, self.max_in_flight)
+        self.batch_bytes = batch_bytes
+        self.min_batch_bytes = min_batch_bytes
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_rows = max_batch_rows
+        self.target_latency = target_latency
+        self.max_attempts = max_attempts
+        self.stats = WriteStats()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._pause_until = 0.0
+        self._error: Optional[BaseException] = None
+        self._on_written: Optional[Callable[[int, int], None]] = None
+
+    def encode(self, row: Union[Dict[str, Any], bytes]) -> bytes:
+        if isinstance(row, bytes):
+            return row
+        if self.omit_nulls:
+            row = {k: v for k, v in row.items() if v is not None}
+        return json.dumps(row, separators=JSON_SEPARATORS).encode("utf-8")
+
+    def write(
+        self,
+        rows: Iterable[Union[Dict[str, Any], bytes]],
+        on_written: Optional[Callable[[int, int], None]] = None,
+    ) -> WriteStats:
+        """Send all rows; `on_written(start, count)` is called (from a worker
+        thread) once rows[start:start + count] are acknowledged."""
+        self.stats = WriteStats()
+        self._on_written = on_written
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            buf = bytearray(b"[")
+            count = 0
+            start = 0
+            for row in rows:
+                if count:
+                    buf += b","
+                buf += self.encode(row)
+                count += 1
+                if len(buf) >= self.batch_bytes or count >= self.max_batch_rows:
+                    buf += b"]"
+                    self._submit(pool, bytes(buf), start, count)
+                    del buf[1:]
+                    start += count
+                    count = 0
+            if count:
+                buf += b"]"
+                self._submit(pool, bytes(buf), start, count)
+        self.stats.finished = time.monotonic()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _submit(self, pool: ThreadPoolExecutor, body: bytes, start: int, count: int) -> None:
+        with self._cond:
+            while self._in_flight >= self.concurrency and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            self._in_flight += 1
+        pool.submit(self._send, body, start, count)
+
+    def _send(self, body: bytes, start: int, count: int) -> None:
+        try:
+            for attempt in range(self.max_attempts):
+                pause = self._pause_until - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                try:
+                    resp = self.client.request(
+                        "POST", self.path, self.headers, body, retries=0, idempotent=self.idempotent
+                    )
+                except HttpError as e:
+                    rejected = e.status in REJECTED_STATUSES
+                    retryable = rejected or (self.idempotent and e.status in RETRY_STATUSES)
+                    if not retryable or attempt + 1 >= self.max_attempts:
+                        raise
+                    self._throttle(attempt, retry_after_seconds(e.headers), shrink=rejected)
+                    continue
+                except (ConnectionError, http.client.HTTPException, TimeoutError, OSError) as e:
+                    retryable = self.idempotent or isinstance(e, ConnectFailed)
+                    if not retryable or attempt + 1 >= self.max_attempts:
+                        raise
+                    self._throttle(attempt, None, shrink=False)
+                    continue
+                # Round trip only: waiting for a pooled connection is not server slowness.
+                self._record(resp.elapsed, count, len(body))
+                if self._on_written is not None:
+                    self._on_written(start, count)
+                return
+        except BaseException as e:
+            with self._cond:
+                if self._error is None:
+                    self._error = e
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _throttle(self, attempt: int, retry_after: Optional[float], shrink: bool = True) -> None:
+        """Pause every sender; with `shrink` (the server pushed back) also halve concurrency and batch size."""
+        delay = retry_after if retry_after is not None else self.client.retry_delay(attempt)
+        with self._cond:
+            if shrink:
+                self.stats.throttled += 1
+                self.concurrency = max(1, self.concurrency // 2)
+                self.batch_bytes = max(self.min_batch_bytes, self.batch_bytes // 2)
+            self._pause_until = max(self._pause_until, time.monotonic() + delay)
+
+    def _record(self, latency: float, count: int, size: int) -> None:
+        with self._cond:
+            self.stats.rows += count
+            self.stats.requests += 1
+            self.stats.bytes_sent += size
+            if latency > self.target_latency:
+                self.batch_bytes = max(self.min_batch_bytes, int(self.batch_bytes * 0.7))
+            elif latency < self.target_latency / 2 and time.monotonic() >= self._pause_until:
+                self.batch_bytes = min(self.max_batch_bytes, int(self.batch_bytes * 1.25))
+                if self.concurrency < self.max_in_flight:
+                    self.concurrency += 1
+                    self._cond.notify_all()
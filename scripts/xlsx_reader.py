@@ -0,0 +1,298 @@
+"""Minimal streaming reader for OOXML (.xlsx) workbooks.
+
+Only the pieces the DUO seed import needs: sheet lookup by name, shared
+strings, inline strings and plain values. Rows are streamed with iterparse so
+memory stays flat regardless of sheet size.
+"""
+
+from __future__ import annotations
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+NS = {
+    "main": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "rel": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "pkgrel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+ROW_TAG = f"{{{NS['main']}}}row"
+CELL_TAG = f"{{{NS['main']}}}c"
+VALUE_TAG = f"{{{NS['main']}}}v"
+INLINE_TAG = f"{{{NS['main']}}}is"
+TEXT_TAG = f"{{{NS['main']}}}t"
+SHEET_DATA_TAG = f"{{{NS['main']}}}sheetData"
+SI_TAG = f"{{{NS['main']}}}si"
+
+Row = List[Optional[str]]
+
+
+class SheetNotFound(KeyError):
+    pass
+
+
+class SharedStrings:
+    """Shared-string table packed into one buffer plus an offsets array.
+
+    Avoids one str object (and list slot) per entry for the lifetime of the
+    workbook; entries are materialised on lookup only.
+    """
+
+    def __init__(self, buffer: str, offsets: "array[int]") -> None:
+        self._buffer = buffer
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            raise IndexError(i)
+        return self._buffer[self._offsets[i] : self._offsets[i + 1]]
+
+
+def read_shared_strings(z: zipfile.ZipFile) -> Optional[SharedStrings]:
+    try:
+        f = z.open("xl/sharedStrings.xml")
+    except KeyError:
+        return None
+    parts: List[str] = []
+    offsets = array("Q", [0])
+    total = 0
+    root: Optional[ET.Element] = None
+    with f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag != SI_TAG:
+                continue
+            text = "".join(t.text or "" for t in elem.iter(TEXT_TAG))
+            parts.append(text)
+            total += len(text)
+            offsets.append(total)
+            root.clear()
+    return SharedStrings("".join(parts), offsets)
+
+
+def cell_value(c: ET.Element, shared_strings: Optional[Sequence[str]]) -> Optional[str]:
+    t = c.attrib.get("t")
+    if t == "inlineStr":
+        is_elem = c.find(INLINE_TAG)
+        if is_elem is None:
+            return None
+        return "".join(el.text or "" for el in is_elem.iter(TEXT_TAG))
+    v = c.find(VALUE_TAG)
+    if v is None:
+        return None
+    value = v.text
+    if value is None:
+        return None
+    if t == "s" and shared_strings is not None:
+        try:
+            return shared_strings[int(value)]
+        except Exception:
+            return value
+    return value
+
+
+def col_key(c: str) -> int:
+    n = 0
+    for ch in c:
+        n = n * 26 + (ord(ch) - ord("A") + 1)
+    return n
+
+
+def cell_col(c: ET.Element) -> str:
+    ref = c.attrib.get("r", "")
+    return "".join(ch for ch in ref if ch.isalpha())
+
+
+def read_sheet_index(z: zipfile.ZipFile) -> Dict[str, str]:
+    """Map sheet name -> worksheet part path, in workbook order."""
+    wb = ET.fromstring(z.read("xl/workbook.xml"))
+    rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+    rel_map = {r.attrib["Id"]: r.attrib["Target"] for r in rels.findall("pkgrel:Relationship", NS)}
+    index: Dict[str, str] = {}
+    for s in wb.findall("main:sheets/main:sheet", NS):
+        target = rel_map.get(s.attrib.get(f"{{{NS['rel']}}}id"))
+        if target:
+            index[s.attrib["name"]] = resolve_target(target)
+    return index
+
+
+def resolve_target(target: str) -> str:
+    # Targets are either package-absolute ("/xl/worksheets/sheet1.xml") or
+    # relative to the workbook part ("worksheets/sheet1.xml").
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+def iter_rows(
+    z: zipfile.ZipFile, path: str, shared_strings: Optional[Sequence[str]]
+) -> Iterator[Dict[str, Optional[str]]]:
+    """Yield {column letter: value} per <row>, clearing parsed elements as we go."""
+    sheet_data: Optional[ET.Element] = None
+    with z.open(path) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag == SHEET_DATA_TAG:
+                    sheet_data = elem
+                continue
+            if elem.tag != ROW_TAG:
+                continue
+            row_map = {cell_col(c): cell_value(c, shared_strings) for c in elem.iter(CELL_TAG)}
+            # Drop the finished row from the tree so the DOM never grows.
+            elem.clear()
+            if sheet_data is not None:
+                sheet_data.clear()
+            yield row_map
+
+
+def stream_sheet(
+    z: zipfile.ZipFile, path: str, shared_strings: Optional[Sequence[str]]
+) -> Tuple[List[str], Iterator[Row]]:
+    """Return (headers, row iterator); data rows are decoded lazily."""
+    rows = iter_rows(z, path, shared_strings)
+    header_map = next(rows, None)
+    if header_map is None:
+        return [], iter(())
+    cols = sorted(header_map, key=col_key)
+    headers = [header_map.get(c) or "" for c in cols]
+
+    def data_rows() -> Iterator[Row]:
+        for row_map in rows:
+            yield [row_map.get(c) for c in cols]
+
+    return headers, data_rows()
+
+
+class Workbook:
+    """An open .xlsx archive; the sheet index and shared strings are parsed once."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self._sheet_index: Optional[Dict[str, str]] = None
+        self._shared_strings: Optional[SharedStrings] = None
+        self._shared_strings_loaded = False
+
+    def __enter__(self) -> "Workbook":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._sheets())
+
+    def _sheets(self) -> Dict[str, str]:
+        if self._sheet_index is None:
+            self._sheet_index = read_sheet_index(self._zip)
+        return self._sheet_index
+
+    @property
+    def shared_strings(self) -> Optional[SharedStrings]:
+        if not self._shared_strings_loaded:
+            self._shared_strings = read_shared_strings(self._zip)
+            self._shared_strings_loaded = True
+        return self._shared_strings
+
+    def sheet(self, sheet_name: str) -> Tuple[List[str], Iterator[Row]]:
+        """Stream `sheet_name`; rows must be consumed before the workbook is closed."""
+        path = self._sheets().get(sheet_name)
+        if path is None:
+            raise SheetNotFound(sheet_name)
+        return stream_sheet(self._zip, path, self.shared_strings)
+
+
+class SheetData:
+    """A fully decoded sheet in columnar form.
+
+    Cell values are interned into `values` (index 0 is None) and every column
+    is an array of indices into it. Repeated strings are stored once and the
+    arrays pickle as flat bytes, which keeps process-pool transfers cheap.
+    """
+
+    def __init__(self, headers: List[str], values: List[Optional[str]], columns: List["array[int]"]) -> None:
+        self.headers = headers
+        self.values = values
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, headers: List[str], rows: Iterable[Row]) -> "SheetData":
+        builder = SheetDataBuilder(headers)
+        for row in rows:
+            builder.append(row)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def __iter__(self) -> Iterator[Row]:
+        values = self.values
+        for idxs in zip(*self.columns):
+            yield [values[i] for i in idxs]
+
+
+class SheetDataBuilder:
+    """Accumulates rows into SheetData incrementally (e.g. while they are streamed)."""
+
+    def __init__(self, headers: List[str]) -> None:
+        self.headers = headers
+        self._values: List[Optional[str]] = [None]
+        self._lookup: Dict[Optional[str], int] = {None: 0}
+        self._columns = [array("I") for _ in headers]
+
+    def append(self, row: Row) -> None:
+        values = self._values
+        lookup = self._lookup
+        for col, value in zip(self._columns, row):
+            i = lookup.get(value)
+            if i is None:
+                i = lookup[value] = len(values)
+                values.append(value)
+            col.append(i)
+
+    def build(self) -> SheetData:
+        return SheetData(self.headers, self._values, self._columns)
+
+
+def read_sheet_data(path: str, sheet_name: str) -> SheetData:
+    with Workbook(path) as workbook:
+        headers, rows = workbook.sheet(sheet_name)
+        return SheetData.from_rows(headers, rows)
+
+
+def parse_sheets_parallel(path: str, sheet_names: Sequence[str], workers: int) -> Dict[str, SheetData]:
+    """Decode independent sheets concurrently, one worker process per sheet.
+
+    Wall time is bounded by the largest sheet rather than the sum of all of
+    them. Raises SheetNotFound if any sheet is missing.
+    """
+    parsed = parse_workbooks_parallel([(path, name) for name in sheet_names], workers)
+    return {name: parsed[(path, name)] for name in sheet_names}
+
+
+def parse_workbooks_parallel(
+    jobs: Sequence[Tuple[str, str]],
+    workers: int,
+    read: Callable[[str, str], SheetData] = read_sheet_data,
+) -> Dict[Tuple[str, str], SheetData]:
+    """Decode (workbook path, sheet name) pairs concurrently in one process pool.
+
+    `read` runs in the workers, so it must be a module-level function.
+    """
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        futures = {job: pool.submit(read, *job) for job in jobs}
+        return {job: future.result() for job, future in futures.items()}
@@ -0,0 +1,38 @@
+-- DUO import: apply many school updates in a single round trip
+-- Called by scripts/import_duo_school_data.py via POST /rest/v1/rpc/duo_bulk_update_schools
+-- with {"p_updates": [{"id": "<uuid>", "<column>": "<value>", ...}, ...]}.
+-- Only keys present in an element are written; other columns keep their value.
+
+create or replace function public.duo_bulk_update_schools(p_updates jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+  updated_count integer;
+begin
+  update public.schools s
+  set
+    duo_school_id = case when u.data ? 'duo_school_id' then u.data->>'duo_school_id' else s.duo_school_id end,
+    brin = case when u.data ? 'brin' then u.data->>'brin' else s.brin end,
+    vestiging_nr = case when u.data ? 'vestiging_nr' then u.data->>'vestiging_nr' else s.vestiging_nr end,
+    denominatie = case when u.data ? 'denominatie' then u.data->>'denominatie' else s.denominatie end,
+    phone = case when u.data ? 'phone' then u.data->>'phone' else s.phone end,
+    postcode = case when u.data ? 'postcode' then u.data->>'postcode' else s.postcode end,
+    street = case when u.data ? 'street' then u.data->>'street' else s.street end,
+    house_nr = case when u.data ? 'house_nr' then u.data->>'house_nr' else s.house_nr end,
+    house_nr_suffix = case when u.data ? 'house_nr_suffix' then u.data->>'house_nr_suffix' else s.house_nr_suffix end,
+    website_url = case when u.data ? 'website_url' then u.data->>'website_url' else s.website_url end
+  from (
+    select (e->>'id')::uuid as id, e - 'id' as data
+    from jsonb_array_elements(p_updates) e
+  ) u
+  where s.id = u.id;
+
+  get diagnostics updated_count = row_count;
+  return updated_count;
+end;
+$$;
+
+-- Import tooling only (service role); no client access
+revoke all on function public.duo_bulk_update_schools(jsonb) from public, anon, authenticated;
+grant execute on function public.duo_bulk_update_schools(jsonb) to service_role;
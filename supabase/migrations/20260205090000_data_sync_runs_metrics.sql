@@ -0,0 +1,4 @@
+-- Per-run instrumentation for import scripts (phase timings, memory, HTTP counters)
+-- Written by scripts/import_duo_school_data.py as a JSON summary; null for older runs.
+alter table public.data_sync_runs
+  add column if not exists metrics jsonb;
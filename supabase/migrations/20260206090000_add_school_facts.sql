@@ -0,0 +1,24 @@
+-- Per-school summary of the latest DUO metrics for the "School facts (DUO data)" block
+-- Rebuilt by scripts/import_duo_school_data.py after metrics are loaded; read by primary key.
+-- facts: {"<metric_group>": {"<metric_name>": {"value": ..., "unit": ..., "period": ...}}},
+-- one entry per metric for its most recent period.
+
+create table if not exists public.school_facts (
+  school_id uuid primary key references public.schools(id) on delete cascade,
+  duo_school_id text,
+  latest_period text,
+  facts jsonb not null default '{}'::jsonb,
+  content_hash text not null,
+  updated_at timestamptz not null default now()
+);
+
+alter table public.school_facts enable row level security;
+
+-- Read-only reference data (same exposure as school_metrics)
+create policy "school_facts_select_public"
+on public.school_facts
+for select
+to public
+using (true);
+
+-- No client writes (imports via server/admin tooling)